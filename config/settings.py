@@ -50,6 +50,9 @@ INSTALLED_APPS = [
 FACEBOOK_PIXEL_ID = '1336021301408836'
 FACEBOOK_PIXEL_ENABLED = True  # Set to False to disable pixel tracking
 FACEBOOK_PIXEL_DEBUG = DEBUG  # Enable debug mode for development
+# Server-side Purchase events (Conversions API) are sent by the job worker when set
+FACEBOOK_CAPI_ACCESS_TOKEN = os.environ.get('FACEBOOK_CAPI_ACCESS_TOKEN')
+FACEBOOK_GRAPH_API_VERSION = 'v19.0'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -57,6 +60,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ecommerce.cart.CartCookieMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -158,9 +162,44 @@ LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Cache
+# Shared between Passenger workers so cache invalidation reaches every process.
+# Set REDIS_URL to use Redis (django-redis); otherwise a file cache is used.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        }
+    }
+
+# Catalog
+CATALOG_FACET_COUNTS = True  # Show product counts next to listing filters
+
 # Session settings for cart
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
+CART_MAX_AGE_DAYS = 30  # cleanup_stale_data deletes guest/empty carts older than this
+STALE_DATA_CLEANUP_INTERVAL = None  # Seconds; set to also run the cleanup inside the app
+STOCK_RESERVATION_MINUTES = 10  # How long opening checkout holds the cart's stock
+STOCK_HOLD_MAX_PER_LINE = 5  # Units of one product a single checkout can hold
+STOCK_HOLD_MAX_PER_HOLDER = 20  # Units a single checkout can hold in total
+JOB_RETENTION_DAYS = 7  # cleanup_stale_data deletes finished background jobs older than this
+
+# Order and contact emails are sent by `manage.py run_jobs`
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -11,7 +11,7 @@ from unfold.contrib.filters.admin import (
 from unfold.decorators import display
 from .models import (
     Category, Product, Cart, CartItem, Order, OrderItem, 
-    Coupon, Promotion, HeroSlider, SearchQuery, StoreSettings, SpecialOffer, ContactMessage
+    Coupon, Promotion, HeroSlider, SearchQuery, StoreSettings, SpecialOffer, ContactMessage, Job
 )
 
 # Dashboard callback function
@@ -518,4 +518,18 @@ class ContactMessageAdmin(ModelAdmin):
         ('Status', {
             'fields': ('is_read',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'updated_at']
+    list_filter = ['status', 'name', ('created_at', RangeDateTimeFilter)]
+    readonly_fields = ['name', 'payload', 'attempts', 'locked_by', 'locked_at', 'last_error', 'created_at', 'updated_at']
+    ordering = ['-created_at']
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        from django.utils import timezone
+        count = queryset.exclude(status=Job.RUNNING).update(status=Job.QUEUED, attempts=0, run_at=timezone.now())
+        self.message_user(request, f'{count} jobs queued again')
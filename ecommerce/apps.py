@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class EcommerceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecommerce'
+
+    def ready(self):
+        # Registers the job handlers run by run_jobs
+        from . import tasks  # noqa: F401
+        from .maintenance import start_scheduler
+        start_scheduler()
@@ -0,0 +1,34 @@
+# cache_versions.py
+"""
+Version stamps kept in the shared cache.
+
+Cached data that can't be deleted key by key (listings, coupon lookups,
+the per-process StoreSettings copy) embeds a version read from here, and
+invalidating it is a single ``bump_version``. Versions start from the clock,
+so a flushed or evicted stamp never comes back as a value an old entry was
+stored under.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    """Current version stored under ``key``, shared by all workers."""
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        # Another worker may have started the stamp first; use theirs
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    """Invalidate everything cached under the version stored at ``key``."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
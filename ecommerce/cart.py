@@ -0,0 +1,388 @@
+# cart.py
+"""
+Shopping cart storage.
+
+``get_cart(request)`` returns a cart object with one interface and two
+implementations:
+
+* ``DatabaseCart`` for logged-in users: Cart/CartItem rows, with totals
+  stored on the Cart row.
+* ``CookieCart`` for guests: ``[product_id, quantity]`` pairs in a signed
+  cookie, written back by ``CartCookieMiddleware``. Adding to a guest cart
+  touches no table at all.
+
+A guest cart becomes database rows only when it has to: ``to_db()`` at
+checkout, and ``merge_guest_cart()`` when the guest logs in or registers.
+Nothing is created for visitors who never add anything, so crawlers and
+one-page visitors leave no session or Cart rows behind.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models.functions import Now
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .models import Cart, CartItem, Product
+from .reservations import release_for
+
+CART_COOKIE = 'cart'
+CART_COOKIE_SALT = 'ecommerce.cart'
+CART_COOKIE_AGE = 60 * 60 * 24 * 30
+# Keeps the signed cookie well under the 4 KB browser limit
+MAX_COOKIE_LINES = 100
+# Upper bound on operations accepted by one /cart/batch/ request
+MAX_BATCH_OPERATIONS = 50
+
+
+class BaseCart:
+    """Interface shared by the cart storages."""
+
+    def __init__(self, request):
+        self.request = request
+        self._lines = None
+
+    @property
+    def lines(self):
+        """Cart lines with ``id``, ``product``, ``quantity`` and ``total_price``."""
+        if self._lines is None:
+            self._lines = self._load_lines()
+        return self._lines
+
+    # Old names, still used by templates
+    @property
+    def total_items(self):
+        return self.item_count
+
+    @property
+    def total_price(self):
+        return self.subtotal
+
+    def get_line(self, line_id):
+        for line in self.lines:
+            if str(line.id) == str(line_id):
+                return line
+        raise Http404('Cart item not found')
+
+    def apply(self, operations):
+        """
+        Apply a list of ``{"op": "add"|"set"|"remove", ...}`` operations.
+
+        ``add`` takes ``product_id`` and ``quantity``; ``set`` and ``remove``
+        take ``item_id`` (or ``product_id``), ``set`` also ``quantity``. The
+        final quantities are computed in memory and stored in one write, so
+        either every operation is applied or none is.
+        """
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise ValueError(f'At most {MAX_BATCH_OPERATIONS} operations per batch')
+
+        current = {line.product.pk: line.quantity for line in self.lines}
+        line_products = {str(line.id): line.product.pk for line in self.lines}
+        wanted = {int(op['product_id']) for op in operations if op.get('product_id') is not None}
+        products = Product.objects.filter(pk__in=wanted, is_active=True).in_bulk() if wanted else {}
+
+        target = dict(current)
+        for op in operations:
+            kind = op.get('op')
+            if op.get('item_id') is not None:
+                product_id = line_products.get(str(op['item_id']))
+            elif op.get('product_id') is not None:
+                product_id = int(op['product_id'])
+            else:
+                product_id = None
+
+            if product_id is None or (product_id not in target and product_id not in products):
+                raise Http404('Cart item not found')
+
+            if kind == 'add':
+                target[product_id] = target.get(product_id, 0) + int(op.get('quantity', 1))
+            elif kind == 'set':
+                target[product_id] = int(op.get('quantity', 1))
+            elif kind == 'remove':
+                target[product_id] = 0
+            else:
+                raise ValueError(f'Unknown cart operation: {kind}')
+
+        target = {pk: quantity for pk, quantity in target.items() if quantity > 0}
+        if target != current:
+            self._store(current, target)
+
+
+class DatabaseCart(BaseCart):
+    """Cart/CartItem rows; the Cart row is created on the first add."""
+
+    def __init__(self, request, cart=None, user=None):
+        super().__init__(request)
+        self.cart = cart
+        self.user = user or request.user
+
+    def _load_lines(self):
+        return list(self.cart.items.select_related('product')) if self.cart else []
+
+    @property
+    def item_count(self):
+        return self.cart.item_count if self.cart else 0
+
+    @property
+    def subtotal(self):
+        return self.cart.subtotal if self.cart else 0
+
+    def _changed(self):
+        self._lines = None
+        # Totals were recomputed in the database by the CartItem write
+        self.cart.refresh_from_db(fields=Cart.TOTAL_FIELDS)
+        if not self.cart.item_count:
+            release_for(self.request)
+
+    def add(self, product, quantity):
+        if self.cart is None:
+            self.cart, created = Cart.objects.get_or_create(user=self.user)
+        item, created = CartItem.objects.get_or_create(
+            cart=self.cart,
+            product=product,
+            defaults={'quantity': quantity}
+        )
+        if not created:
+            item.quantity += quantity
+            item.save()
+        self._changed()
+        return item
+
+    def set_quantity(self, line_id, quantity):
+        """Set a line's quantity (removing it at 0); returns the line or None."""
+        item = get_object_or_404(CartItem, id=line_id, cart=self.cart)
+        if quantity <= 0:
+            item.delete()
+            item = None
+        else:
+            item.quantity = quantity
+            item.save()
+        self._changed()
+        return item
+
+    def remove(self, line_id):
+        get_object_or_404(CartItem, id=line_id, cart=self.cart).delete()
+        self._changed()
+
+    def clear(self):
+        if self.cart is not None:
+            self.cart.items.all().delete()
+            self._changed()
+
+    def to_db(self):
+        if self.cart is None:
+            self.cart, created = Cart.objects.get_or_create(user=self.user)
+        return self.cart
+
+    def _store(self, current, target):
+        with transaction.atomic():
+            cart = self.to_db()
+            changed = [
+                CartItem(cart=cart, product_id=pk, quantity=quantity)
+                for pk, quantity in target.items() if current.get(pk) != quantity
+            ]
+            if changed:
+                # One INSERT ... ON CONFLICT (cart, product) DO UPDATE for all lines
+                CartItem.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=['cart', 'product'],
+                    update_fields=['quantity'],
+                )
+            removed = [pk for pk in current if pk not in target]
+            if removed:
+                cart.items.filter(product_id__in=removed).delete()
+        self._changed()
+
+
+class CookieLine:
+    """A guest cart line; mirrors the CartItem attributes templates use."""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        return self.product.pk
+
+    @property
+    def total_price(self):
+        if self.product.is_on_sale:
+            return self.product.discount_price * self.quantity
+        return self.product.price * self.quantity
+
+
+class CookieCart(BaseCart):
+    """Guest cart kept in a signed cookie as ordered (product id, quantity) pairs."""
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.quantities = {}
+        self.modified = False
+        self.db_cart = None
+        value = request.COOKIES.get(CART_COOKIE)
+        if value:
+            try:
+                pairs = signing.loads(value, salt=CART_COOKIE_SALT, max_age=CART_COOKIE_AGE)
+                self.quantities = {int(pk): int(quantity) for pk, quantity in pairs if int(quantity) > 0}
+            except (signing.BadSignature, TypeError, ValueError):
+                # Tampered or outdated cookie: start over with an empty cart
+                self.modified = True
+
+    def _load_lines(self):
+        products = Product.objects.filter(pk__in=list(self.quantities), is_active=True).in_bulk()
+        if len(products) != len(self.quantities):
+            # Drop products that were deleted or deactivated
+            self.quantities = {pk: qty for pk, qty in self.quantities.items() if pk in products}
+            self.modified = True
+        return [CookieLine(products[pk], quantity) for pk, quantity in self.quantities.items()]
+
+    @property
+    def item_count(self):
+        # From the loaded lines, so products dropped on load aren't counted
+        return sum(line.quantity for line in self.lines)
+
+    @property
+    def subtotal(self):
+        return sum((line.total_price for line in self.lines), 0)
+
+    def _changed(self):
+        self._lines = None
+        self.modified = True
+        if not self.quantities:
+            release_for(self.request)
+
+    def add(self, product, quantity):
+        if product.pk not in self.quantities and len(self.quantities) >= MAX_COOKIE_LINES:
+            raise ValueError('Cart is full')
+        self.quantities[product.pk] = self.quantities.get(product.pk, 0) + quantity
+        self._changed()
+        return CookieLine(product, self.quantities[product.pk])
+
+    def set_quantity(self, line_id, quantity):
+        line = self.get_line(line_id)
+        if quantity <= 0:
+            del self.quantities[line.product.pk]
+            line = None
+        else:
+            self.quantities[line.product.pk] = quantity
+            line = CookieLine(line.product, quantity)
+        self._changed()
+        return line
+
+    def remove(self, line_id):
+        del self.quantities[self.get_line(line_id).product.pk]
+        self._changed()
+
+    def _store(self, current, target):
+        if len(target) > MAX_COOKIE_LINES:
+            raise ValueError('Cart is full')
+        self.quantities = target
+        self._changed()
+
+    def clear(self):
+        self.quantities = {}
+        self._changed()
+        if self.db_cart is not None:
+            # The rows only existed for checkout
+            self.db_cart.delete()
+            self.db_cart = None
+
+    def to_db(self):
+        """Copy the lines into a Cart/CartItem pair of rows (for checkout)."""
+        if self.db_cart is None:
+            self.db_cart = Cart.objects.create(session_key=self.request.session.session_key)
+            CartItem.objects.bulk_create([
+                CartItem(cart=self.db_cart, product=line.product, quantity=line.quantity)
+                for line in self.lines
+            ])
+            self.db_cart.refresh_from_db(fields=Cart.TOTAL_FIELDS)
+        return self.db_cart
+
+    def save_cookie(self, response):
+        if not self.quantities:
+            response.delete_cookie(CART_COOKIE)
+            return
+        value = signing.dumps(list(self.quantities.items()), salt=CART_COOKIE_SALT, compress=True)
+        response.set_cookie(
+            CART_COOKIE, value,
+            max_age=CART_COOKIE_AGE,
+            secure=settings.SESSION_COOKIE_SECURE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+def get_cart(request):
+    """Return the request's cart storage, memoized on the request."""
+    if not hasattr(request, '_cart'):
+        if request.user.is_authenticated:
+            request._cart = DatabaseCart(request, Cart.objects.filter(user=request.user).first())
+        else:
+            request._cart = request._cookie_cart = CookieCart(request)
+    return request._cart
+
+
+def merge_guest_cart(request, user):
+    """
+    Move the guest cookie cart into ``user``'s database cart after login or
+    registration.
+
+    Reads both carts once and writes the lines with one bulk_create and
+    one bulk_update, so the cost doesn't grow per line. The user's cart is
+    fetched with get_or_create against the unique constraint on
+    ``Cart.user``, so concurrent logins can't create two carts, and the row
+    is written before its items are read, which makes concurrent merges
+    wait for each other (a row lock on PostgreSQL, the database write lock
+    on SQLite) instead of interleaving.
+    """
+    guest = getattr(request, '_cookie_cart', None) or CookieCart(request)
+    request._cookie_cart = guest
+
+    if not guest.quantities:
+        request._cart = DatabaseCart(request, Cart.objects.filter(user=user).first(), user=user)
+        return request._cart
+
+    with transaction.atomic():
+        user_cart, created = Cart.objects.get_or_create(user=user)
+        # Lock before reading the items; select_for_update is a no-op on SQLite
+        Cart.objects.filter(pk=user_cart.pk).update(updated_at=Now())
+        existing = {item.product_id: item for item in user_cart.items.all()}
+        active = set(
+            Product.objects.filter(pk__in=list(guest.quantities), is_active=True).values_list('pk', flat=True)
+        )
+
+        new_items, updated_items = [], []
+        for product_id, quantity in guest.quantities.items():
+            if product_id not in active:
+                continue
+            if product_id in existing:
+                existing[product_id].quantity += quantity
+                updated_items.append(existing[product_id])
+            else:
+                new_items.append(CartItem(cart=user_cart, product_id=product_id, quantity=quantity))
+
+        if new_items:
+            CartItem.objects.bulk_create(new_items)
+        if updated_items:
+            CartItem.objects.bulk_update(updated_items, ['quantity'])
+
+    guest.clear()
+    user_cart.refresh_from_db(fields=Cart.TOTAL_FIELDS)
+    request._cart = DatabaseCart(request, user_cart, user=user)
+    return request._cart
+
+
+class CartCookieMiddleware:
+    """Write the guest cart cookie back when a view changed it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        guest = getattr(request, '_cookie_cart', None)
+        if guest is not None and guest.modified:
+            guest.save_cookie(response)
+        return response
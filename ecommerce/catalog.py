@@ -0,0 +1,256 @@
+# catalog.py
+"""
+Shared filter/sort compiler for product listings.
+
+``product_list``, ``load_more_products`` and ``offers`` all build their
+querysets through ``CatalogQuery`` so the first page and every AJAX page run
+the same SQL, and the normalized filter spec is the key of the listing cache.
+
+Listing results (ordered product ids plus total count) are cached per spec
+and per catalog version. The version is bumped on every Product/Category
+save or delete, so a stale listing never outlives an admin edit.
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db import models
+
+from .cache_versions import bump_version, get_version
+from .models import Product
+from .pagination import (
+    DEFAULT_SORT, SORT_ORDERINGS, KeysetPage, KeysetPaginator,
+    apply_sort, decode_cursor, encode_cursor,
+)
+from .search import backend as search_backend, filter_by_search
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Cached listings hold at most this many ids; deeper pages go to the database
+LISTING_CACHE_MAX_IDS = 1000
+# Stock and popularity change through queryset.update() without a version
+# bump, so listings also expire on their own.
+LISTING_CACHE_TIMEOUT = 60 * 10
+
+# price_range param -> (min, max); None means unbounded
+PRICE_RANGES = {
+    '0-500': (None, Decimal('500')),
+    '500-1000': (Decimal('500'), Decimal('1000')),
+    '1000-2000': (Decimal('1000'), Decimal('2000')),
+    '2000+': (Decimal('2000'), None),
+}
+PRICE_RANGE_LABELS = {
+    '0-500': '৳০ - ৳৫০০',
+    '500-1000': '৳৫০০ - ৳১০০০',
+    '1000-2000': '৳১০০০ - ৳২০০০',
+    '2000+': '৳২০০০+',
+}
+
+
+def get_catalog_version():
+    """Current catalog version, shared by all workers through the cache."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Invalidate every cached listing and facet summary."""
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def _clean_text(value):
+    return ' '.join((value or '').split())
+
+
+def _clean_decimal(value):
+    if not value:
+        return None
+    try:
+        number = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return number if number.is_finite() else None
+
+
+class CatalogQuery:
+    """
+    Normalized, hashable product listing filter.
+
+    Build one with ``from_params(request.GET)`` or directly with keyword
+    arguments, then call ``queryset()`` or ``page()``.
+    """
+
+    FIELDS = (
+        'category', 'search', 'price_range', 'min_price', 'max_price',
+        'in_stock', 'on_sale', 'brand', 'sort',
+    )
+
+    def __init__(self, category='', search='', price_range='', min_price=None,
+                 max_price=None, in_stock=False, on_sale=False, brand='', sort=''):
+        self.category = _clean_text(category)
+        self.search = _clean_text(search)
+        self.price_range = price_range if price_range in PRICE_RANGES else ''
+        self.min_price = _clean_decimal(min_price)
+        self.max_price = _clean_decimal(max_price)
+        self.in_stock = bool(in_stock)
+        self.on_sale = bool(on_sale)
+        self.brand = _clean_text(brand)
+        # Searches are ranked by relevance unless another sort is chosen
+        if sort not in SORT_ORDERINGS or (sort == 'relevance' and not self.search):
+            sort = 'relevance' if self.search else DEFAULT_SORT
+        self.sort = sort
+
+    @classmethod
+    def from_params(cls, params):
+        """Parse a QueryDict (or any mapping) of listing GET params."""
+        return cls(
+            category=params.get('category'),
+            search=params.get('search'),
+            price_range=params.get('price_range'),
+            min_price=params.get('min_price'),
+            max_price=params.get('max_price'),
+            in_stock=params.get('in_stock') == 'true',
+            on_sale=params.get('on_sale') == 'true',
+            brand=params.get('brand'),
+            sort=params.get('sort'),
+        )
+
+    @property
+    def spec(self):
+        """Tuple of normalized values; equal filters give equal specs."""
+        return (
+            self.category,
+            self.search.casefold(),
+            self.price_range,
+            str(self.min_price) if self.min_price is not None else '',
+            str(self.max_price) if self.max_price is not None else '',
+            self.in_stock,
+            self.on_sale,
+            self.brand.casefold(),
+            self.sort,
+        )
+
+    @property
+    def cache_key(self):
+        digest = hashlib.md5(repr(self.spec).encode('utf-8')).hexdigest()
+        return f'catalog:query:{digest}'
+
+    def __eq__(self, other):
+        return isinstance(other, CatalogQuery) and self.spec == other.spec
+
+    def __hash__(self):
+        return hash(self.spec)
+
+    def __repr__(self):
+        return f'<CatalogQuery {dict(zip(self.FIELDS, self.spec))}>'
+
+    @property
+    def ordering(self):
+        if self.sort == 'relevance' and search_backend() is None:
+            return SORT_ORDERINGS[DEFAULT_SORT]
+        return SORT_ORDERINGS[self.sort]
+
+    def filter_queryset(self, queryset):
+        """Apply the filters (but not the ordering) to ``queryset``."""
+        queryset = queryset.filter(is_active=True)
+
+        if self.category:
+            queryset = queryset.filter(category__slug=self.category)
+
+        if self.search:
+            matched = filter_by_search(queryset, self.search)
+            if matched is not None:
+                queryset = matched
+            else:
+                queryset = queryset.filter(
+                    models.Q(name__icontains=self.search) |
+                    models.Q(description__icontains=self.search) |
+                    models.Q(meta_keywords__icontains=self.search)
+                )
+
+        # Price filters use what the shopper actually pays
+        if self.price_range:
+            low, high = PRICE_RANGES[self.price_range]
+            if low is not None:
+                queryset = queryset.filter(effective_price__gte=low)
+            if high is not None:
+                queryset = queryset.filter(effective_price__lte=high)
+
+        if self.min_price is not None:
+            queryset = queryset.filter(effective_price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(effective_price__lte=self.max_price)
+
+        if self.in_stock:
+            queryset = queryset.filter(stock__gt=0)
+
+        if self.on_sale:
+            queryset = queryset.filter(effective_price__lt=models.F('price'))
+
+        if self.brand:
+            queryset = queryset.filter(brand__icontains=self.brand)
+
+        return queryset
+
+    def queryset(self):
+        """Filtered and ordered queryset of active products."""
+        queryset = self.filter_queryset(Product.objects.all())
+        return apply_sort(queryset, self.sort)[0]
+
+    def listing(self):
+        """
+        Cached ``{'ids': [...], 'total': n, 'complete': bool}`` for this spec.
+
+        ``ids`` is the ordered result, truncated to ``LISTING_CACHE_MAX_IDS``
+        (``complete`` is False when it was truncated).
+        """
+        key = f'{self.cache_key}:{get_catalog_version()}'
+        listing = cache.get(key)
+        if listing is None:
+            queryset = self.queryset()
+            ids = list(queryset.values_list('id', flat=True)[:LISTING_CACHE_MAX_IDS + 1])
+            complete = len(ids) <= LISTING_CACHE_MAX_IDS
+            listing = {
+                'ids': ids[:LISTING_CACHE_MAX_IDS],
+                'total': len(ids) if complete else queryset.count(),
+                'complete': complete,
+            }
+            cache.set(key, listing, LISTING_CACHE_TIMEOUT)
+        return listing
+
+    def page(self, cursor=None, per_page=12):
+        """
+        Keyset page of results; see ``pagination.KeysetPaginator``.
+
+        Served from the cached id list when the page lies inside it; the
+        cursor format is the same either way.
+        """
+        listing = self.listing()
+        ids = listing['ids']
+
+        start = 0
+        if cursor:
+            # The last value of every ordering is the id of the last row seen
+            last_id = decode_cursor(self.ordering, cursor)[-1]
+            try:
+                start = ids.index(last_id) + 1
+            except ValueError:
+                start = None
+
+        end = None if start is None else start + per_page + 1
+        if start is None or (end > len(ids) and not listing['complete']):
+            page = KeysetPaginator(self.queryset(), self.ordering, per_page).page(cursor)
+            page.total = listing['total']
+            return page
+
+        page_ids = ids[start:start + per_page]
+        has_more = len(ids) > start + per_page
+        rows = {product.pk: product for product in self.queryset().filter(id__in=page_ids)}
+        if len(rows) != len(page_ids):
+            # A cached product is gone or no longer matches; its sort values
+            # are unknown, so let the database work out where this page ends.
+            page = KeysetPaginator(self.queryset(), self.ordering, per_page).page(cursor)
+            page.total = listing['total']
+            return page
+        products = [rows[pk] for pk in page_ids]
+        next_cursor = encode_cursor(self.ordering, products[-1]) if has_more and products else None
+        return KeysetPage(products, has_more, next_cursor, total=listing['total'])
@@ -0,0 +1,113 @@
+# checkout.py
+"""
+Order placement.
+
+``place_order`` turns a cart into an order as one atomic unit: one read of
+the cart lines, one read of their products (which also snapshots the
+prices), one conditional UPDATE that takes the stock for every line (and
+adds the sale to the popularity scores), a conditional UPDATE redeeming the
+coupon, one bulk INSERT of the order items and one of the follow-up jobs
+(see tasks.py). The stock UPDATE only
+touches rows that still have enough units beyond what other shoppers hold
+(see reservations.py); if it matches fewer rows than there are lines,
+another buyer got there first and the whole transaction is rolled back.
+"""
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Now
+
+from . import coupons
+from .models import OrderItem, Product, StockReservation
+from .popularity import decay_weight
+from .reservations import release
+from .tasks import queue_order_placed
+
+
+class CheckoutError(Exception):
+    """The order could not be placed; the message is shown to the shopper."""
+
+
+class OutOfStock(CheckoutError):
+    def __init__(self, products=()):
+        self.products = list(products)
+        names = ', '.join(product.name for product in self.products)
+        if names:
+            super().__init__(f'Not enough stock for: {names}')
+        else:
+            super().__init__('Some items in your cart just sold out')
+
+
+def _per_product(quantities, factor=1):
+    """CASE id WHEN ... THEN quantity * factor END over the cart's products."""
+    output_field = models.FloatField() if isinstance(factor, float) else models.IntegerField()
+    return models.Case(
+        *[models.When(pk=pk, then=models.Value(quantity * factor)) for pk, quantity in quantities.items()],
+        output_field=output_field,
+    )
+
+
+def place_order(order, cart, coupon_code=None, holder=None):
+    """
+    Save ``order`` (an unsaved Order with the customer fields filled in)
+    with the lines of ``cart`` (a Cart row) and empty the cart.
+
+    ``holder`` is the buyer's reservation token: its holds are what the
+    order consumes, every other active hold is off limits.
+
+    The coupon discount is computed here from the snapshotted prices, never
+    taken from the client. Raises OutOfStock/CheckoutError without writing
+    anything when a line can't be fulfilled or the coupon can't be used.
+    """
+    with transaction.atomic():
+        quantities = {}
+        for product_id, quantity in cart.items.values_list('product_id', 'quantity'):
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if not quantities:
+            raise CheckoutError('Your cart is empty')
+
+        # Prices are snapshotted from this single fetch
+        products = Product.objects.filter(pk__in=list(quantities), is_active=True).in_bulk()
+        missing = [pk for pk in quantities if pk not in products]
+        if missing:
+            raise CheckoutError('Some items in your cart are no longer available')
+        held = StockReservation.objects.held(list(quantities), exclude_holder=holder)
+        short = [product for pk, product in products.items() if product.stock - held.get(pk, 0) < quantities[pk]]
+        if short:
+            raise OutOfStock(short)
+
+        needed = _per_product(quantities)
+        held_by_others = StockReservation.objects.held_subquery(exclude_holder=holder)
+        taken = Product.objects.filter(pk__in=list(quantities), stock__gte=needed + held_by_others).update(
+            stock=models.F('stock') - needed,
+            popularity_score=models.F('popularity_score') + _per_product(quantities, decay_weight()),
+            # Changes the product card cache key so the new stock shows up
+            updated_at=Now(),
+        )
+        if taken != len(quantities):
+            # A concurrent order took the last units after our read
+            raise OutOfStock()
+
+        subtotal = sum((products[pk].effective_price * quantity for pk, quantity in quantities.items()), Decimal('0'))
+        discount = Decimal('0')
+        if coupon_code:
+            try:
+                coupon, discount = coupons.quote(coupon_code, subtotal)
+                coupons.redeem(coupon)
+            except coupons.CouponError as e:
+                raise CheckoutError(str(e))
+        order.total_amount = max(subtotal - discount, Decimal('0'))
+        order.save()
+
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[pk], quantity=quantity, price=products[pk].effective_price)
+            for pk, quantity in quantities.items()
+        ])
+
+        # Emails and tracking run in the job worker, and only if this commits
+        queue_order_placed(order)
+
+        cart.items.all().delete()
+        if holder:
+            release(holder)
+    return order
@@ -1,86 +1,79 @@
 # context_processors.py
+"""
+Template context shared by every storefront page.
+
+Each processor returns ``SimpleLazyObject`` values, so nothing is queried
+until a template actually uses the variable. Results are memoized on the
+request, so a ``render_to_string(..., request=request)`` inside a view reuses
+what the page (or an earlier fragment) already loaded.
+"""
 from django.conf import settings
-from .models import Cart, Category, StoreSettings, SearchQuery, Promotion, SpecialOffer, Coupon, Order
+from django.db import DatabaseError
+from django.utils.functional import SimpleLazyObject
+from .cart import get_cart
+from .models import Category, StoreSettings, SearchQuery, Promotion, SpecialOffer, Coupon, Order
+
+def _request_cached(request, key, func):
+    """Return func(), computed at most once per request."""
+    cache = request.__dict__.setdefault('_context_cache', {})
+    if key not in cache:
+        cache[key] = func()
+    return cache[key]
+
+def _lazy(request, key, func):
+    return SimpleLazyObject(lambda: _request_cached(request, key, func))
 
 def cart_items(request):
-    cart = None
-    cart_items_count = 0
-    cart_total = 0
-    cart_items = []
-    
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        session_key = request.session.session_key
-        if session_key:
-            cart, created = Cart.objects.get_or_create(session_key=session_key)
-    
-    if cart:
-        cart_items_count = cart.total_items
-        cart_total = cart.total_price
-        cart_items = cart.items.select_related('product').all()
-    
+    """Cart badge and sidebar; see cart.py for where the cart lives"""
     return {
-        'cart': cart,
-        'cart_items_count': cart_items_count,
-        'cart_total': cart_total,
-        'cart_items': cart_items,
+        'cart': SimpleLazyObject(lambda: get_cart(request)),
+        'cart_items_count': SimpleLazyObject(lambda: get_cart(request).item_count),
+        'cart_total': SimpleLazyObject(lambda: get_cart(request).subtotal),
+        'cart_items': SimpleLazyObject(lambda: get_cart(request).lines),
     }
 
+def _load_store_settings():
+    try:
+        # Cached per process; reloads only after an edit bumps the version
+        return StoreSettings.get_settings()
+    except DatabaseError:
+        # Table doesn't exist yet (before migrate)
+        return None
+
 def store_settings(request):
     """Add store settings to all templates"""
-    try:
-        from django.db import connection
-        # Check if the table exists
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ecommerce_storesettings';")
-            if cursor.fetchone():
-                settings = StoreSettings.get_settings()
-            else:
-                settings = None
-    except Exception as e:
-        # Fallback if table doesn't exist yet or any other error
-        settings = None
-    
     return {
-        'store_settings': settings,
+        'store_settings': _lazy(request, 'store_settings', _load_store_settings),
     }
 
 def categories_processor(request):
     """Add categories to all templates"""
-    categories = Category.objects.filter(is_active=True)
     return {
-        'categories': categories,
+        'categories': _lazy(request, 'categories', lambda: list(Category.objects.filter(is_active=True))),
     }
 
 def trending_searches(request):
     """Add trending searches to all templates"""
-    trending = SearchQuery.objects.all()[:8]
     return {
-        'trending_searches': trending,
+        'trending_searches': _lazy(request, 'trending_searches', lambda: list(SearchQuery.objects.all()[:8])),
     }
 
 def promotions_processor(request):
     """Add active promotions to all templates"""
-    active_promotions = Promotion.objects.filter(is_active=True)[:3]
     return {
-        'active_promotions': active_promotions,
+        'active_promotions': _lazy(request, 'active_promotions', lambda: list(Promotion.objects.filter(is_active=True)[:3])),
     }
 
 def special_offers_processor(request):
     """Add special offers to all templates"""
-    special_offers = SpecialOffer.objects.filter(is_active=True)[:3]
     return {
-        'special_offers': special_offers,
+        'special_offers': _lazy(request, 'special_offers', lambda: list(SpecialOffer.objects.filter(is_active=True)[:3])),
     }
 
 def coupons_processor(request):
     """Add active coupons to all templates"""
-    active_coupons = Coupon.objects.filter(is_active=True)[:3]
     return {
-        'active_coupons': active_coupons,
+        'active_coupons': _lazy(request, 'active_coupons', lambda: list(Coupon.objects.filter(is_active=True)[:3])),
     }
 
 def facebook_pixel(request):
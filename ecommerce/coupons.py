@@ -0,0 +1,87 @@
+# coupons.py
+"""
+Coupon lookup, pricing and redemption.
+
+Coupon definitions are cached by normalized code (unknown codes too), so a
+flash-sale burst of the same code costs cache reads rather than coupon
+table queries. The cache is versioned and the version is bumped whenever a
+coupon is saved or deleted.
+
+The cached ``used_count`` is only a hint. ``redeem`` is what enforces the
+usage limit: a conditional UPDATE that increments ``used_count`` only while
+it is below ``usage_limit``, so concurrent orders can never redeem more
+than the limit.
+"""
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+
+from .cache_versions import bump_version, get_version
+from .models import Coupon
+
+COUPON_VERSION_KEY = 'coupon:version'
+COUPON_CACHE_TIMEOUT = 60 * 5
+# Cached in place of a Coupon for codes that don't exist
+MISSING = 'missing'
+
+
+class CouponError(Exception):
+    """The coupon can't be used; the message is shown to the shopper."""
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def bump_coupon_version():
+    """Drop every cached coupon definition."""
+    bump_version(COUPON_VERSION_KEY)
+
+
+def get_coupon(code):
+    """Return the Coupon for ``code`` (case-insensitive), or None."""
+    code = normalize_code(code)
+    if not code:
+        return None
+    key = f'coupon:{get_version(COUPON_VERSION_KEY)}:{code}'
+    coupon = cache.get(key)
+    if coupon is None:
+        coupon = Coupon.objects.filter(code__iexact=code).first() or MISSING
+        cache.set(key, coupon, COUPON_CACHE_TIMEOUT)
+    return None if coupon == MISSING else coupon
+
+
+def quote(code, amount):
+    """
+    Return ``(coupon, discount)`` for using ``code`` on an order of
+    ``amount`` (the server-side cart subtotal); raises CouponError.
+    """
+    coupon = get_coupon(code)
+    if coupon is None:
+        raise CouponError('Invalid coupon code')
+    if not coupon.is_valid():
+        raise CouponError('Coupon has expired or is not active')
+    if amount < coupon.minimum_amount:
+        raise CouponError(f'Minimum order amount is ৳{coupon.minimum_amount}')
+    return coupon, coupon.calculate_discount(amount)
+
+
+def redeem(coupon):
+    """
+    Count one use of ``coupon`` if it is still valid and under its limit.
+
+    Call inside the order's transaction; raises CouponError when the coupon
+    was used up (or deactivated) in the meantime.
+    """
+    now = timezone.now()
+    redeemed = Coupon.objects.filter(
+        models.Q(usage_limit__isnull=True) | models.Q(used_count__lt=models.F('usage_limit')),
+        pk=coupon.pk,
+        is_active=True,
+        valid_from__lte=now,
+        valid_to__gte=now,
+    ).update(used_count=models.F('used_count') + 1)
+    if not redeemed:
+        # Stop quoting it from the cache as if it were still available
+        bump_coupon_version()
+        raise CouponError('This coupon has reached its usage limit')
@@ -0,0 +1,84 @@
+# facets.py
+"""
+Precomputed filter facets for the product listing sidebar.
+
+One pass over the active catalog builds, per category (and for the whole
+catalog under ``ALL``), the brand list with counts, price bounds, a histogram
+over the ``price_range`` buckets and in-stock / on-sale counts. The result is
+cached per catalog version (bumped when a Product or Category changes), so
+rendering the sidebar costs no aggregate queries.
+"""
+from django.core.cache import cache
+
+from .catalog import PRICE_RANGES, get_catalog_version
+from .models import Product
+
+FACETS_CACHE_KEY = 'catalog:facets'
+# Edits bump the catalog version; the timeout only bounds drift from stock
+# changes made with queryset.update(), which send no signals.
+FACETS_TIMEOUT = 60 * 15
+
+# Facet key for "all categories"
+ALL = ''
+
+
+def _empty_facets():
+    return {
+        'total': 0,
+        'in_stock': 0,
+        'on_sale': 0,
+        'min_price': None,
+        'max_price': None,
+        'price_ranges': dict.fromkeys(PRICE_RANGES, 0),
+        'brands': {},
+    }
+
+
+def _add(facets, brand, effective_price, price, stock):
+    facets['total'] += 1
+    if stock > 0:
+        facets['in_stock'] += 1
+    if effective_price < price:
+        facets['on_sale'] += 1
+    if facets['min_price'] is None or effective_price < facets['min_price']:
+        facets['min_price'] = effective_price
+    if facets['max_price'] is None or effective_price > facets['max_price']:
+        facets['max_price'] = effective_price
+    # Bounds are inclusive on both ends, like the price_range filter
+    for key, (low, high) in PRICE_RANGES.items():
+        if (low is None or effective_price >= low) and (high is None or effective_price <= high):
+            facets['price_ranges'][key] += 1
+    if brand:
+        facets['brands'][brand] = facets['brands'].get(brand, 0) + 1
+
+
+def build_facets():
+    """Compute facets for every category in one query."""
+    by_category = {ALL: _empty_facets()}
+    rows = Product.objects.filter(is_active=True).values_list(
+        'category__slug', 'brand', 'effective_price', 'price', 'stock'
+    )
+    for slug, brand, effective_price, price, stock in rows.iterator():
+        if slug not in by_category:
+            by_category[slug] = _empty_facets()
+        _add(by_category[ALL], brand, effective_price, price, stock)
+        _add(by_category[slug], brand, effective_price, price, stock)
+
+    for facets in by_category.values():
+        facets['brands'] = sorted(facets['brands'].items())
+    return by_category
+
+
+def get_facets(category_slug=ALL):
+    """Cached facets for one category (or the whole catalog)."""
+    key = f'{FACETS_CACHE_KEY}:{get_catalog_version()}'
+    by_category = cache.get(key)
+    if by_category is None:
+        by_category = build_facets()
+        cache.set(key, by_category, FACETS_TIMEOUT)
+    facets = by_category.get(category_slug or ALL, _empty_facets())
+    facets['category_counts'] = {
+        slug: category_facets['total']
+        for slug, category_facets in by_category.items() if slug != ALL
+    }
+    return facets
@@ -1,7 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
-from .models import Order
+from .models import ContactMessage, Order
 
 class LoginForm(AuthenticationForm):
     username = forms.CharField(
@@ -60,4 +60,23 @@ class UserProfileForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={
                 'class': 'w-full border border-gray-300 rounded-lg px-4 py-2 focus:outline-none focus:ring-2 focus:ring-primary'
             }),
-        }
\ No newline at end of file
+        }
+
+class ContactForm(forms.ModelForm):
+    SUBJECT_CHOICES = [
+        ('', 'বিষয় নির্বাচন করুন'),
+        ('general', 'সাধারণ জিজ্ঞাসা'),
+        ('order', 'অর্ডার সংক্রান্ত'),
+        ('delivery', 'ডেলিভারি সংক্রান্ত'),
+        ('payment', 'পেমেন্ট সংক্রান্ত'),
+        ('product', 'পণ্য সংক্রান্ত'),
+        ('complaint', 'অভিযোগ'),
+        ('suggestion', 'পরামর্শ'),
+        ('other', 'অন্যান্য'),
+    ]
+
+    subject = forms.ChoiceField(choices=SUBJECT_CHOICES)
+
+    class Meta:
+        model = ContactMessage
+        fields = ['name', 'email', 'phone', 'subject', 'message']
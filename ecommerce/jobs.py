@@ -0,0 +1,126 @@
+# jobs.py
+"""
+A small database-backed job queue for work that shouldn't hold up a
+request: notification emails, admin alerts, Facebook server events and
+analytics writes.
+
+Requests ``enqueue`` a Job row, normally inside their own transaction, so
+a rolled-back order never sends its emails. ``manage.py run_jobs`` claims
+due jobs in batches and runs the function registered under the job's name
+with ``@task``. Claiming is a conditional UPDATE on ``status``, so several
+workers can poll the same table without running a job twice.
+
+A failed job is retried with exponential backoff until ``max_attempts``,
+then left as ``failed`` with its last error for the admin. A job whose
+worker died mid-run is put back in the queue after ``LOCK_TIMEOUT``, so
+handlers should tolerate running twice.
+"""
+import datetime
+import logging
+import secrets
+
+from django.db import models
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_MAX_ATTEMPTS = 5
+# Retry delays: 30 s, 1 min, 2 min, ... capped at one hour
+BACKOFF_BASE = 30
+BACKOFF_MAX = 60 * 60
+LOCK_TIMEOUT = datetime.timedelta(minutes=10)
+
+_registry = {}
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs named ``name``."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS, **payload):
+    """Queue ``name(**payload)``; the payload must be JSON-serializable."""
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + datetime.timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(calls):
+    """Queue several ``(name, payload)`` jobs with one INSERT."""
+    now = timezone.now()
+    return Job.objects.bulk_create([
+        Job(name=name, payload=payload, max_attempts=DEFAULT_MAX_ATTEMPTS, run_at=now)
+        for name, payload in calls
+    ])
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying a job that failed ``attempts`` times."""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def requeue_stale():
+    """Put back jobs whose worker stopped before finishing them."""
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - LOCK_TIMEOUT).update(
+        status=Job.QUEUED, locked_by='',
+    )
+
+
+def claim(batch_size=DEFAULT_BATCH_SIZE):
+    """Take up to ``batch_size`` due jobs for this worker, oldest first."""
+    now = timezone.now()
+    ids = list(
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by('run_at', 'id').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = secrets.token_hex(16)
+    # Jobs another worker claimed in the meantime are no longer queued
+    Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+        status=Job.RUNNING, locked_by=token, locked_at=now, attempts=models.F('attempts') + 1,
+    )
+    return list(Job.objects.filter(pk__in=ids, status=Job.RUNNING, locked_by=token).order_by('run_at', 'id'))
+
+
+def _failed(job, error):
+    if job.attempts >= job.max_attempts or job.name not in _registry:
+        logger.error(f"Job {job} failed for good: {error}")
+        job.status = Job.FAILED
+    else:
+        logger.warning(f"Job {job} failed (attempt {job.attempts}), retrying: {error}")
+        job.status = Job.QUEUED
+        job.run_at = timezone.now() + datetime.timedelta(seconds=backoff(job.attempts))
+    job.locked_by = ''
+    job.last_error = str(error)[:2000]
+    job.save(update_fields=['status', 'run_at', 'locked_by', 'last_error', 'updated_at'])
+
+
+def run_batch(batch_size=DEFAULT_BATCH_SIZE):
+    """Claim and run one batch; returns the number of jobs run."""
+    jobs = claim(batch_size)
+    done = []
+    for job in jobs:
+        handler = _registry.get(job.name)
+        try:
+            if handler is None:
+                raise LookupError(f'No task registered as {job.name!r}')
+            handler(**job.payload)
+        except Exception as e:
+            _failed(job, e)
+        else:
+            done.append(job.pk)
+    if done:
+        Job.objects.filter(pk__in=done).update(
+            status=Job.DONE, locked_by='', last_error='', updated_at=timezone.now(),
+        )
+    return len(jobs)
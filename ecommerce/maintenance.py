@@ -0,0 +1,130 @@
+# maintenance.py
+"""
+Housekeeping for tables that only grow: expired sessions, abandoned
+carts, lapsed stock holds and finished background jobs.
+
+Rows are deleted in small batches, each in its own short transaction with a
+pause in between, so the SQLite write lock is never held for long and
+storefront requests keep going while a cleanup runs. Used by the
+``cleanup_stale_data`` command and, when ``STALE_DATA_CLEANUP_INTERVAL`` is
+set, by a background thread in each worker (a cache lock makes sure only
+one worker actually runs it per interval).
+"""
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cart, Job, StockReservation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAUSE = 0.05
+CLEANUP_LOCK_KEY = 'maintenance:cleanup'
+
+
+def _delete_in_batches(queryset, batch_size, pause):
+    """Delete ``queryset`` ``batch_size`` rows at a time; returns rows deleted."""
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        count, per_model = queryset.model.objects.filter(pk__in=pks).delete()
+        deleted += count
+        if len(pks) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def purge_expired_sessions(batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    return _delete_in_batches(Session.objects.filter(expire_date__lt=timezone.now()), batch_size, pause)
+
+
+def purge_stale_carts(max_age_days, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """
+    Delete guest carts and empty user carts not touched for ``max_age_days``.
+
+    User carts that still hold items are kept however old they are.
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=max_age_days)
+    stale = Cart.objects.filter(updated_at__lt=cutoff).filter(Q(user__isnull=True) | Q(item_count=0))
+    return _delete_in_batches(stale, batch_size, pause)
+
+
+def purge_expired_reservations(batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """Delete stock holds that have lapsed (they already count for nothing)."""
+    return _delete_in_batches(StockReservation.objects.filter(expires_at__lte=timezone.now()), batch_size, pause)
+
+
+def purge_finished_jobs(max_age_days, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """Delete done and failed jobs last touched more than ``max_age_days`` ago."""
+    cutoff = timezone.now() - datetime.timedelta(days=max_age_days)
+    finished = Job.objects.filter(status__in=[Job.DONE, Job.FAILED], updated_at__lt=cutoff)
+    return _delete_in_batches(finished, batch_size, pause)
+
+
+def database_size():
+    """Return (bytes used, bytes free inside the file) for the default database."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA page_count')
+            page_count = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            free_pages = cursor.fetchone()[0]
+            return page_count * page_size, free_pages * page_size
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0], None
+    return None, None
+
+
+def run_cleanup(max_age_days=None, batch_size=DEFAULT_BATCH_SIZE, pause=DEFAULT_PAUSE):
+    """Run every cleanup; returns {'sessions': n, 'carts': n, 'reservations': n, 'jobs': n}."""
+    if max_age_days is None:
+        max_age_days = settings.CART_MAX_AGE_DAYS
+    return {
+        'sessions': purge_expired_sessions(batch_size, pause),
+        'carts': purge_stale_carts(max_age_days, batch_size, pause),
+        'reservations': purge_expired_reservations(batch_size, pause),
+        'jobs': purge_finished_jobs(settings.JOB_RETENTION_DAYS, batch_size, pause),
+    }
+
+
+def _scheduler(interval):
+    while True:
+        time.sleep(interval)
+        # Whichever worker takes the lock runs this round; the rest skip it
+        if not cache.add(CLEANUP_LOCK_KEY, True, interval):
+            continue
+        try:
+            reclaimed = run_cleanup()
+            logger.info(f"Stale data cleanup: {reclaimed['sessions']} sessions, {reclaimed['carts']} carts, "
+                        f"{reclaimed['reservations']} stock holds, {reclaimed['jobs']} jobs")
+        except Exception as e:
+            logger.error(f"Stale data cleanup failed: {e}")
+        finally:
+            connection.close()
+
+
+_scheduler_started = False
+
+
+def start_scheduler():
+    """Start the periodic cleanup thread if STALE_DATA_CLEANUP_INTERVAL is set."""
+    global _scheduler_started
+    interval = getattr(settings, 'STALE_DATA_CLEANUP_INTERVAL', None)
+    if not interval or _scheduler_started:
+        return
+    _scheduler_started = True
+    threading.Thread(target=_scheduler, args=(interval,), name='stale-data-cleanup', daemon=True).start()
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ecommerce.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute effective_price and discount_percent for all products'
+
+    def handle(self, *args, **options):
+        updated = Product.objects.all().refresh_pricing()
+        self.stdout.write(self.style.SUCCESS(f'✓ Refreshed pricing for {updated} products'))
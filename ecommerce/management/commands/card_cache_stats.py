@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from ecommerce.templatetags.catalog_tags import card_cache_stats, reset_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the product card fragment cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = card_cache_stats()
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else '-'
+        self.stdout.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {hit_rate}")
+        if options['reset']:
+            reset_card_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✓ Counters reset'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from ecommerce import search
+from ecommerce.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index'
+
+    def handle(self, *args, **options):
+        engine = search.backend()
+        if engine is None:
+            self.stdout.write(self.style.WARNING('No full-text search backend available; search uses icontains'))
+            return
+        if engine == 'postgres':
+            self.stdout.write(self.style.SUCCESS('PostgreSQL search index is an expression index; nothing to rebuild'))
+            return
+
+        count = search.rebuild_index(Product.objects.all().iterator())
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {count} products'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models.functions import Coalesce
+from ecommerce.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Verify stored cart item_count/subtotal against the cart lines and repair mismatches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report mismatches, do not fix them')
+
+    def handle(self, *args, **options):
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        carts = Cart.objects.annotate(
+            expected_count=Coalesce(models.Sum('items__quantity'), models.Value(0)),
+            expected_subtotal=Coalesce(
+                models.Sum(models.F('items__quantity') * models.F('items__product__effective_price'), output_field=money),
+                models.Value(0),
+                output_field=money,
+            ),
+        ).filter(
+            ~models.Q(item_count=models.F('expected_count')) | ~models.Q(subtotal=models.F('expected_subtotal'))
+        )
+        mismatched = list(carts.values_list('pk', 'item_count', 'expected_count', 'subtotal', 'expected_subtotal'))
+
+        for pk, item_count, expected_count, subtotal, expected_subtotal in mismatched:
+            self.stdout.write(
+                f'Cart {pk}: items {item_count} -> {expected_count}, subtotal {subtotal} -> {expected_subtotal}'
+            )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('✓ All cart totals are correct'))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(f'{len(mismatched)} carts have wrong totals'))
+        else:
+            Cart.objects.filter(pk__in=[row[0] for row in mismatched]).refresh_totals()
+            self.stdout.write(self.style.SUCCESS(f'✓ Repaired totals of {len(mismatched)} carts'))
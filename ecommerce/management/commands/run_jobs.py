@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ecommerce.jobs import DEFAULT_BATCH_SIZE, requeue_stale, run_batch
+
+# How often the worker looks for jobs abandoned by a crashed worker
+STALE_CHECK_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (order emails, admin alerts, tracking events, search stats)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Jobs claimed per batch')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due now, then exit')
+
+    def handle(self, *args, **options):
+        last_stale_check = 0
+        total = 0
+        try:
+            while True:
+                if time.monotonic() - last_stale_check >= STALE_CHECK_INTERVAL:
+                    requeue_stale()
+                    last_stale_check = time.monotonic()
+
+                ran = run_batch(options['batch_size'])
+                total += ran
+                if not ran:
+                    if options['once']:
+                        break
+                    close_old_connections()
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'✓ Ran {total} jobs'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ecommerce.popularity import recompute_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute sales-based product popularity scores from order history'
+
+    def handle(self, *args, **options):
+        count = recompute_scores()
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated popularity for {count} products'))
@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+from ecommerce import search
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(search.PG_CREATE_SQL)
+        return
+    if connection.vendor != 'sqlite':
+        return
+
+    try:
+        schema_editor.execute(search.FTS_CREATE_SQL)
+    except OperationalError:
+        # SQLite built without FTS5: search falls back to icontains
+        return
+
+    Product = apps.get_model('ecommerce', 'Product')
+    rows = []
+    for product in Product.objects.all():
+        keywords = ' '.join(filter(None, [product.meta_keywords, product.brand]))
+        rows.append((
+            product.pk,
+            ' '.join(search.index_terms(product.name)),
+            ' '.join(search.index_terms(keywords)),
+            ' '.join(search.index_terms(product.description)),
+        ))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {search.FTS_TABLE} (rowid, name, keywords, description) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(search.PG_DROP_SQL)
+    elif vendor == 'sqlite':
+        schema_editor.execute(search.FTS_DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0007_order_is_viewed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
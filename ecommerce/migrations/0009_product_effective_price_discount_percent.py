@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def backfill_pricing(apps, schema_editor):
+    Product = apps.get_model('ecommerce', 'Product')
+    products = list(Product.objects.only('id', 'price', 'discount_price'))
+    for product in products:
+        on_sale = product.discount_price is not None and product.discount_price < product.price
+        product.effective_price = product.discount_price if on_sale else product.price
+        if on_sale and product.price:
+            product.discount_percent = int(((product.price - product.discount_price) / product.price) * 100)
+        else:
+            product.discount_percent = 0
+    Product.objects.bulk_update(products, ['effective_price', 'discount_percent'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_pricing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+from ecommerce.popularity import EXCLUDED_STATUSES, compute_scores
+
+
+def backfill_popularity(apps, schema_editor):
+    OrderItem = apps.get_model('ecommerce', 'OrderItem')
+    Product = apps.get_model('ecommerce', 'Product')
+    rows = OrderItem.objects.exclude(order__status__in=EXCLUDED_STATUSES).values_list(
+        'product_id', 'quantity', 'order__created_at'
+    )
+    scores = compute_scores(rows)
+    products = list(Product.objects.filter(pk__in=list(scores)).only('id'))
+    for product in products:
+        product.popularity_score = scores[product.pk]
+    Product.objects.bulk_update(products, ['popularity_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0009_product_effective_price_discount_percent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='popularity_score',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+from ecommerce.search import normalize_query
+
+
+def merge_duplicate_queries(apps, schema_editor):
+    """Fill normalized_query and fold rows that normalize the same into one."""
+    SearchQuery = apps.get_model('ecommerce', 'SearchQuery')
+    kept = {}
+    for row in SearchQuery.objects.order_by('-count', '-last_searched', 'id'):
+        key = normalize_query(row.query)[:200] or f'#{row.pk}'
+        if key not in kept:
+            kept[key] = {'id': row.pk, 'count': row.count, 'last_searched': row.last_searched, 'merged': []}
+            continue
+        target = kept[key]
+        target['count'] += row.count
+        target['last_searched'] = max(target['last_searched'], row.last_searched)
+        target['merged'].append(row.pk)
+
+    for key, target in kept.items():
+        # update() rather than save() so auto_now doesn't touch last_searched
+        SearchQuery.objects.filter(pk=target['id']).update(
+            normalized_query=key, count=target['count'], last_searched=target['last_searched'],
+        )
+        if target['merged']:
+            SearchQuery.objects.filter(pk__in=target['merged']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_product_popularity_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchquery',
+            name='normalized_query',
+            field=models.CharField(editable=False, max_length=200, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_queries, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='searchquery',
+            name='normalized_query',
+            field=models.CharField(editable=False, max_length=200, unique=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def backfill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model('ecommerce', 'Cart')
+    CartItem = apps.get_model('ecommerce', 'CartItem')
+    totals = {}
+    for cart_id, quantity, price in CartItem.objects.values_list('cart_id', 'quantity', 'product__effective_price'):
+        count, subtotal = totals.get(cart_id, (0, 0))
+        totals[cart_id] = (count + quantity, subtotal + quantity * price)
+    carts = list(Cart.objects.filter(pk__in=list(totals)).only('id'))
+    for cart in carts:
+        cart.item_count, cart.subtotal = totals[cart.pk]
+    Cart.objects.bulk_update(carts, ['item_count', 'subtotal'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_searchquery_normalized_query'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_cart_totals, migrations.RunPython.noop),
+    ]
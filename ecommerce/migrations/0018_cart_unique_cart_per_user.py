@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+
+def merge_duplicate_user_carts(apps, schema_editor):
+    """Fold every user's extra carts into their most recently updated one."""
+    Cart = apps.get_model('ecommerce', 'Cart')
+    CartItem = apps.get_model('ecommerce', 'CartItem')
+    duplicated = (
+        Cart.objects.filter(user__isnull=False).values('user')
+        .annotate(carts=models.Count('id')).filter(carts__gt=1).values_list('user', flat=True)
+    )
+    for user_id in list(duplicated):
+        keep, *extra = Cart.objects.filter(user_id=user_id).order_by('-updated_at', '-id')
+        quantities = {item.product_id: item for item in CartItem.objects.filter(cart=keep)}
+        for item in CartItem.objects.filter(cart__in=extra):
+            if item.product_id in quantities:
+                quantities[item.product_id].quantity += item.quantity
+                quantities[item.product_id].save(update_fields=['quantity'])
+            else:
+                quantities[item.product_id] = CartItem.objects.create(
+                    cart=keep, product_id=item.product_id, quantity=item.quantity,
+                )
+        Cart.objects.filter(pk__in=[cart.pk for cart in extra]).delete()
+        # Historical models have no refresh_totals(); recompute the stored totals here
+        items = CartItem.objects.filter(cart=keep).select_related('product')
+        Cart.objects.filter(pk=keep.pk).update(
+            item_count=sum(item.quantity for item in items),
+            subtotal=sum(item.product.effective_price * item.quantity for item in items),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0017_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_user_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_per_user'),
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, Now, Round
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from . import cache_versions
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
@@ -39,12 +44,73 @@ class Category(models.Model):
         else:
             return None
 
+def discount_percent(price, discount_price):
+    """
+    Whole percent off, rounded down, computed on integer cents.
+
+    ProductQuerySet.refresh_pricing does the same sum in SQL, so both write
+    paths store the same value whatever float maths the database uses.
+    """
+    price_cents = int(price * 100)
+    if price_cents <= 0:
+        return 0
+    return (price_cents - int(discount_price * 100)) * 100 // price_cents
+
+
+def _cents(field):
+    return Cast(Round(models.F(field) * 100), models.IntegerField())
+
+
+class ProductQuerySet(models.QuerySet):
+    PRICING_FIELDS = {'price', 'discount_price'}
+
+    def update(self, **kwargs):
+        """Keep effective_price/discount_percent in sync on bulk price updates"""
+        if self.PRICING_FIELDS.isdisjoint(kwargs):
+            return super().update(**kwargs)
+        # Changes the product card cache key so the new price shows up
+        kwargs.setdefault('updated_at', Now())
+        with transaction.atomic(using=self.db):
+            # Resolve the rows first: the filter may depend on the old price
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            self.model._default_manager.filter(pk__in=pks).refresh_pricing()
+            Cart.objects.filter(items__product__in=pks).refresh_totals()
+            # Cached listings are sorted and filtered by price too
+            from .catalog import bump_catalog_version
+            transaction.on_commit(bump_catalog_version, using=self.db)
+        return rows
+
+    def refresh_pricing(self):
+        """Recompute the materialized pricing columns in one UPDATE"""
+        on_sale = models.Q(discount_price__isnull=False, discount_price__lt=models.F('price'))
+        return self.update(
+            effective_price=models.Case(
+                models.When(on_sale, then=models.F('discount_price')),
+                default=models.F('price'),
+            ),
+            discount_percent=models.Case(
+                models.When(
+                    on_sale & models.Q(price__gt=0),
+                    # Integer division on whole cents, like discount_percent()
+                    then=(_cents('price') - _cents('discount_price')) * 100 / _cents('price'),
+                ),
+                default=models.Value(0),
+            ),
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Materialized from price/discount_price for indexed sorting and filtering
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, db_index=True)
+    discount_percent = models.PositiveSmallIntegerField(default=0, editable=False, db_index=True)
+    # Time-decayed units sold, see popularity.py
+    popularity_score = models.FloatField(default=0, editable=False, db_index=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='products/')
     stock = models.PositiveIntegerField(default=0)
@@ -68,12 +134,37 @@ class Product(models.Model):
     weight = models.CharField(max_length=50, blank=True, help_text="Product weight (e.g., 1kg, 500g)")
     dimensions = models.CharField(max_length=100, blank=True, help_text="Product dimensions")
     
+    objects = ProductQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
         return self.name
     
+    @property
+    def available_stock(self):
+        """Stock minus units held by shoppers in checkout"""
+        if not hasattr(self, '_held_stock'):
+            self._held_stock = StockReservation.objects.held([self.pk]).get(self.pk, 0)
+        return max(self.stock - self._held_stock, 0)
+    
+    def save(self, *args, **kwargs):
+        self.refresh_pricing()
+        update_fields = kwargs.get('update_fields')
+        pricing_changed = update_fields is None or not ProductQuerySet.PRICING_FIELDS.isdisjoint(update_fields)
+        if update_fields is not None and pricing_changed:
+            kwargs['update_fields'] = set(update_fields) | {'effective_price', 'discount_percent'}
+        super().save(*args, **kwargs)
+        if pricing_changed:
+            # Carts holding this product store subtotals at its price
+            Cart.objects.filter(items__product=self).refresh_totals()
+    
+    def refresh_pricing(self):
+        """Recompute effective_price and discount_percent from the prices"""
+        self.effective_price = self.discount_price if self.is_on_sale else self.price
+        self.discount_percent = self.sale_percentage if self.price else 0
+    
     @property
     def is_on_sale(self):
         return self.discount_price is not None and self.discount_price < self.price
@@ -81,7 +172,7 @@ class Product(models.Model):
     @property
     def sale_percentage(self):
         if self.is_on_sale:
-            return int(((self.price - self.discount_price) / self.price) * 100)
+            return discount_percent(self.price, self.discount_price)
         return 0
     
     def get_meta_title(self):
@@ -136,11 +227,46 @@ class Product(models.Model):
         }
         return json.dumps(data, ensure_ascii=False)
 
+class CartQuerySet(models.QuerySet):
+    def refresh_totals(self):
+        """Recompute item_count and subtotal from the cart lines in one UPDATE"""
+        lines = CartItem.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        return self.update(
+            item_count=Coalesce(
+                models.Subquery(lines.annotate(total=models.Sum('quantity')).values('total')),
+                models.Value(0),
+            ),
+            subtotal=Coalesce(
+                models.Subquery(lines.annotate(total=models.Sum(
+                    models.F('quantity') * models.F('product__effective_price'), output_field=money,
+                )).values('total')),
+                models.Value(Decimal('0')),
+                output_field=money,
+            ),
+            # update() skips auto_now; stale-cart cleanup relies on this
+            updated_at=Now(),
+        )
+
+
 class Cart(models.Model):
+    TOTAL_FIELDS = ['item_count', 'subtotal']
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=40, null=True, blank=True)
+    session_key = models.CharField(max_length=40, null=True, blank=True, db_index=True)
+    # Kept in sync by CartItem writes (see CartQuerySet.refresh_totals)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = CartQuerySet.as_manager()
+    
+    class Meta:
+        constraints = [
+            # One cart per user; guest carts (user NULL) are not affected
+            models.UniqueConstraint(fields=['user'], name='unique_cart_per_user'),
+        ]
     
     def __str__(self):
         if self.user:
@@ -149,29 +275,136 @@ class Cart(models.Model):
     
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.subtotal
     
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
+    
+    def refresh_totals(self):
+        """Recompute the stored totals and reload them on this instance"""
+        Cart.objects.filter(pk=self.pk).refresh_totals()
+        self.refresh_from_db(fields=self.TOTAL_FIELDS)
+
+class CartItemQuerySet(models.QuerySet):
+    def _refresh_carts(self, cart_ids):
+        Cart.objects.filter(pk__in=cart_ids).refresh_totals()
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            cart_ids = list(self.values_list('cart_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            self._refresh_carts(cart_ids)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            cart_ids = list(self.values_list('cart_id', flat=True).distinct())
+            result = super().delete()
+            self._refresh_carts(cart_ids)
+        return result
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            self._refresh_carts({obj.cart_id for obj in objs})
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            rows = super().bulk_update(objs, fields, *args, **kwargs)
+            self._refresh_carts({obj.cart_id for obj in objs})
+        return rows
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
     
+    objects = CartItemQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['cart', 'product']
     
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Cart.objects.filter(pk=self.cart_id).refresh_totals()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Cart.objects.filter(pk=self.cart_id).refresh_totals()
+        return result
+    
     @property
     def total_price(self):
         if self.product.is_on_sale:
             return self.product.discount_price * self.quantity
         return self.product.price * self.quantity
 
+class StockReservationQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def held(self, product_ids, exclude_holder=None):
+        """{product_id: units held} by unexpired holds, in one grouped query"""
+        queryset = self.active().filter(product_id__in=product_ids)
+        if exclude_holder:
+            queryset = queryset.exclude(holder=exclude_holder)
+        return dict(
+            queryset.order_by().values('product_id').annotate(total=models.Sum('quantity')).values_list('product_id', 'total')
+        )
+
+    def held_subquery(self, exclude_holder=None):
+        """Units of the outer Product held by others, for use in filters"""
+        queryset = self.active().filter(product=models.OuterRef('pk'))
+        if exclude_holder:
+            queryset = queryset.exclude(holder=exclude_holder)
+        held = queryset.order_by().values('product').annotate(total=models.Sum('quantity')).values('total')
+        return Coalesce(models.Subquery(held), 0, output_field=models.IntegerField())
+
+class StockReservation(models.Model):
+    """Units held for a shopper in checkout until expires_at, see reservations.py"""
+    # Per-session token, so guest carts that only live in a cookie can hold stock too
+    holder = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    
+    objects = StockReservationQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ['holder', 'product']
+        indexes = [models.Index(fields=['product', 'expires_at'], name='reservation_product_expiry')]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for {self.holder}"
+
+class OrderNumberSequence(models.Model):
+    """Per-day order counter behind Order.order_number"""
+    day = models.DateField(primary_key=True)
+    last_value = models.PositiveIntegerField(default=0)
+    
+    @classmethod
+    def next_order_number(cls):
+        """
+        Next ``YYMMDD-NNNNN`` number (local date), e.g. ``261018-00042``.
+
+        The increment is a single UPDATE, so workers serialize on the day's
+        row and never hand out the same number; numbers sort by time and new
+        orders append to the end of the unique index.
+        """
+        day = timezone.localdate()
+        with transaction.atomic():
+            cls.objects.get_or_create(day=day)
+            cls.objects.filter(day=day).update(last_value=models.F('last_value') + 1)
+            value = cls.objects.filter(day=day).values_list('last_value', flat=True).get()
+        return f"{day:%y%m%d}-{value:05d}"
+
 # models.py তে Order class এর মধ্যে এই method যোগ করুন:
 
 class Order(models.Model):
@@ -184,7 +417,10 @@ class Order(models.Model):
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    order_number = models.CharField(max_length=20, unique=True)
+    # Assigned on first save, see OrderNumberSequence
+    order_number = models.CharField(max_length=20, unique=True, blank=True)
+    # Token of the checkout form that placed it; a resubmitted form finds this order
+    checkout_token = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -206,6 +442,11 @@ class Order(models.Model):
     def __str__(self):
         return self.order_number
     
+    def save(self, *args, **kwargs):
+        if not self.order_number:
+            self.order_number = OrderNumberSequence.next_order_number()
+        super().save(*args, **kwargs)
+    
     # NEW METHOD: For badge count
     @staticmethod
     def get_new_orders_count(request):
@@ -303,6 +544,8 @@ class HeroSlider(models.Model):
 
 class SearchQuery(models.Model):
     query = models.CharField(max_length=200)
+    # Casefolded, whitespace-collapsed query; one row per distinct search
+    normalized_query = models.CharField(max_length=200, unique=True, editable=False)
     count = models.PositiveIntegerField(default=1)
     last_searched = models.DateTimeField(auto_now=True)
     
@@ -311,6 +554,11 @@ class SearchQuery(models.Model):
     
     def __str__(self):
         return f"{self.query} ({self.count})"
+    
+    def save(self, *args, **kwargs):
+        from .search import normalize_query
+        self.normalized_query = normalize_query(self.query)[:200]
+        super().save(*args, **kwargs)
 
 class SpecialOffer(models.Model):
     title = models.CharField(max_length=200)
@@ -330,6 +578,10 @@ class SpecialOffer(models.Model):
     def __str__(self):
         return self.title
 
+STORE_SETTINGS_VERSION_KEY = 'store_settings:version'
+# (version, instance) loaded by this process
+_store_settings = (None, None)
+
 class StoreSettings(models.Model):
     store_name = models.CharField(max_length=200, default='🌿 আমার ফ্রেশ বিডি')
     logo = models.ImageField(upload_to='store/', null=True, blank=True)
@@ -377,11 +629,29 @@ class StoreSettings(models.Model):
             existing = StoreSettings.objects.first()
             self.pk = existing.pk
         super().save(*args, **kwargs)
+        transaction.on_commit(StoreSettings.bump_version)
+
+    @classmethod
+    def bump_version(cls):
+        """Make every worker reload the settings on its next request"""
+        cache_versions.bump_version(STORE_SETTINGS_VERSION_KEY)
 
     @classmethod
     def get_settings(cls):
-        """Get or create store settings singleton"""
-        obj, created = cls.objects.get_or_create(pk=1)
+        """
+        Get or create store settings singleton.
+        
+        Each process keeps the loaded instance and only reloads it when the
+        version stamp in the shared cache changes, so the steady state costs
+        one cache read and no queries. Treat the result as read-only.
+        """
+        global _store_settings
+        version = cache_versions.get_version(STORE_SETTINGS_VERSION_KEY)
+        
+        cached_version, obj = _store_settings
+        if obj is None or cached_version != version:
+            obj, created = cls.objects.get_or_create(pk=1)
+            _store_settings = (version, obj)
         return obj
 
 class ContactMessage(models.Model):
@@ -404,8 +674,41 @@ class ContactMessage(models.Model):
         return f"{self.name} - {self.subject}"
 
 
+class Job(models.Model):
+    """Background work queued by requests and run by ``manage.py run_jobs``, see jobs.py"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    # Claim token of the worker running it
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'], name='job_status_run_at')]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
 # Order signals - models.py এর একদম শেষে যোগ করুন
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
 @receiver(pre_save, sender=Order)
@@ -414,4 +717,55 @@ def set_order_as_unviewed(sender, instance, **kwargs):
     Ensure new orders are marked as unviewed
     """
     if not instance.pk:  # New order
-        instance.is_viewed = False        
\ No newline at end of file
+        instance.is_viewed = False
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_caches(sender, **kwargs):
+    """Invalidate cached listings and facets whenever the catalog changes"""
+    from .catalog import bump_catalog_version
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, **kwargs):
+    """Keep the full-text search index in sync with product edits"""
+    from .search import index_product
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_search_index(sender, instance, **kwargs):
+    from .search import remove_product
+    remove_product(instance.pk)
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_carts(sender, instance, **kwargs):
+    """Note the carts holding the product; the cascade fast-deletes their items"""
+    instance._cart_ids = list(Cart.objects.filter(items__product=instance).values_list('pk', flat=True).distinct())
+
+
+@receiver(post_delete, sender=Product)
+def refresh_product_carts(sender, instance, **kwargs):
+    """The cascade skips CartItemQuerySet.delete(), so recompute the totals here"""
+    cart_ids = getattr(instance, '_cart_ids', None)
+    if cart_ids:
+        Cart.objects.filter(pk__in=cart_ids).refresh_totals()
+
+
+@receiver(post_delete, sender=StoreSettings)
+def invalidate_store_settings(sender, **kwargs):
+    """Drop every worker's cached settings once the delete commits"""
+    transaction.on_commit(StoreSettings.bump_version)
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def invalidate_coupon_cache(sender, **kwargs):
+    """Drop cached coupon definitions after an admin edit"""
+    from .coupons import bump_coupon_version
+    bump_coupon_version()
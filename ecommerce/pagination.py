@@ -0,0 +1,139 @@
+# pagination.py
+"""
+Keyset (cursor) pagination for product listings.
+
+Instead of OFFSET/LIMIT plus a COUNT on every scroll, each page remembers the
+sort values of its last row in an opaque, signed cursor. The next page starts
+with a ``WHERE (sort_value, id) > (last_value, last_id)`` style filter, so deep
+pages cost the same as the first one.
+"""
+import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.db import models
+
+CURSOR_SALT = 'ecommerce.pagination.cursor'
+
+# sort param -> ordering used for both ORDER BY and the keyset filter.
+# Every ordering ends with the primary key so it is total (no ties).
+SORT_ORDERINGS = {
+    'newest': ('-created_at', '-id'),
+    'name': ('name', 'id'),
+    'price_low': ('effective_price', 'id'),
+    'price_high': ('-effective_price', '-id'),
+    'popular': ('-popularity_score', '-id'),
+    'discount': ('-discount_percent', '-id'),
+    'relevance': ('search_rank', 'id'),
+}
+DEFAULT_SORT = 'newest'
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor is malformed, tampered with or for another sort."""
+
+
+def apply_sort(queryset, sort_by):
+    """
+    Order ``queryset`` for the given ``sort`` param.
+
+    Returns ``(queryset, ordering)`` where ``ordering`` is the tuple the
+    keyset paginator needs. Unknown values fall back to newest first.
+    ``relevance`` needs the ``search_rank`` annotation added by
+    ``search.filter_by_search`` (best match first).
+    """
+    if sort_by not in SORT_ORDERINGS or (
+            sort_by == 'relevance' and 'search_rank' not in queryset.query.annotations):
+        sort_by = DEFAULT_SORT
+
+    if sort_by == 'discount':
+        queryset = queryset.filter(effective_price__lt=models.F('price'))
+
+    ordering = SORT_ORDERINGS[sort_by]
+    return queryset.order_by(*ordering), ordering
+
+
+def _encode_value(value):
+    # Keep full precision: DjangoJSONEncoder truncates datetimes to
+    # milliseconds, which would break equality on the tie-breaker.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(ordering, obj):
+    """Build an opaque cursor pointing just after ``obj``."""
+    values = [_encode_value(getattr(obj, field.lstrip('-'))) for field in ordering]
+    return signing.dumps({'o': list(ordering), 'v': values}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(ordering, cursor):
+    """Return the list of sort values stored in ``cursor``."""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Invalid cursor')
+    if data.get('o') != list(ordering) or len(data.get('v', [])) != len(ordering):
+        raise InvalidCursor('Cursor does not match the current sort order')
+    return data['v']
+
+
+def keyset_filter(ordering, values):
+    """
+    Q object selecting rows strictly after ``values`` in ``ordering``.
+
+    For ``(a, b)`` ascending this is ``a > va OR (a = va AND b > vb)``.
+    """
+    condition = models.Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = models.Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            clause &= models.Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= clause
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_more, next_cursor, total=None):
+        self.object_list = object_list
+        self.has_more = has_more
+        self.next_cursor = next_cursor
+        # Total result count, when known without an extra query
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate an already ordered queryset by cursor.
+
+    ``has_more`` is computed by fetching ``per_page + 1`` rows, so no COUNT
+    query is ever issued.
+    """
+
+    def __init__(self, queryset, ordering, per_page=12):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        queryset = self.queryset
+        if cursor:
+            values = decode_cursor(self.ordering, cursor)
+            queryset = queryset.filter(keyset_filter(self.ordering, values))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        next_cursor = encode_cursor(self.ordering, rows[-1]) if has_more else None
+        return KeysetPage(rows, has_more, next_cursor)
@@ -0,0 +1,63 @@
+# popularity.py
+"""
+Sales-driven popularity ranking.
+
+Scores use forward exponential decay: a sale at time ``t`` adds
+``quantity * 2 ** ((t - EPOCH) / HALF_LIFE)`` to the product's score. Older
+sales are never rewritten, yet their relative weight halves every half-life,
+so ``place_order`` adds a sale with an ``F()`` increment in its stock
+UPDATE and ``ORDER BY popularity_score`` is always the decayed ranking.
+``recompute_scores`` (the ``update_popularity`` command) rebuilds
+everything from OrderItem.
+
+Weights double every half-life, so a float score overflows about 39 years
+(1024 half-lives) after ``EPOCH``. Only ratios between scores matter, so
+re-base well before that: move ``EPOCH`` forward (any date up to now) and
+run ``update_popularity`` right after deploying it. The rebuild rewrites
+every score against the new epoch; until it runs, orders placed under the
+new epoch are overweighted against the old scores.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+HALF_LIFE_DAYS = 14
+
+# Orders in these states do not count as sales
+EXCLUDED_STATUSES = ('cancelled',)
+
+
+def decay_weight(when=None):
+    """Weight of one unit sold at ``when`` (default: now)."""
+    when = when or timezone.now()
+    half_lives = (when - EPOCH).total_seconds() / (HALF_LIFE_DAYS * 24 * 60 * 60)
+    return 2.0 ** half_lives
+
+
+def compute_scores(order_items):
+    """Return ``{product_id: score}`` from ``(product_id, quantity, created_at)`` rows."""
+    scores = defaultdict(float)
+    for product_id, quantity, created_at in order_items:
+        scores[product_id] += quantity * decay_weight(created_at)
+    return scores
+
+
+def recompute_scores():
+    """Rebuild every product's score from order history; returns products scored."""
+    from .models import OrderItem, Product
+
+    rows = OrderItem.objects.exclude(order__status__in=EXCLUDED_STATUSES).values_list(
+        'product_id', 'quantity', 'order__created_at'
+    )
+    scores = compute_scores(rows.iterator())
+
+    with transaction.atomic():
+        Product.objects.exclude(pk__in=list(scores)).update(popularity_score=0)
+        products = list(Product.objects.filter(pk__in=list(scores)).only('id'))
+        for product in products:
+            product.popularity_score = scores[product.pk]
+        Product.objects.bulk_update(products, ['popularity_score'], batch_size=500)
+    return len(products)
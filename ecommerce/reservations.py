@@ -0,0 +1,107 @@
+# reservations.py
+"""
+Time-limited stock holds for shoppers in checkout.
+
+Opening the checkout page holds the cart's quantities for
+``STOCK_RESERVATION_MINUTES``; other shoppers see (and can buy) only
+``stock - active holds``. Holds are never locked rows: they live in the
+StockReservation table, are ignored as soon as ``expires_at`` passes, and
+the lapsed rows are deleted lazily the next time those products are held
+(and by ``cleanup_stale_data``). ``place_order`` consumes the buyer's own
+holds and refuses stock held by anyone else. A cart that is emptied drops
+its holds straight away (``release_for``) rather than at expiry.
+
+A hold is a fairness guarantee, not the oversell guard: that is still the
+conditional stock UPDATE in ``place_order``.
+
+Holds are capped per line (``STOCK_HOLD_MAX_PER_LINE``) and per holder
+(``STOCK_HOLD_MAX_PER_HOLDER``), so one visitor putting the whole stock in
+a cart and opening checkout can't make it unavailable to everyone else.
+Units above the caps stay unheld and are only taken when the order is
+placed.
+"""
+import datetime
+import secrets
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+HOLDER_SESSION_KEY = 'stock_holder'
+
+
+def get_holder(request):
+    """The request's holder token, created (with the session) on first use."""
+    holder = request.session.get(HOLDER_SESSION_KEY)
+    if not holder:
+        holder = request.session[HOLDER_SESSION_KEY] = secrets.token_hex(16)
+    return holder
+
+
+def hold(holder, quantities, minutes=None):
+    """
+    Hold ``{product_id: quantity}`` for ``holder`` (replacing its earlier
+    holds), within the per-line and per-holder caps, and return the
+    products that don't have enough free stock for the wanted quantity.
+    """
+    if minutes is None:
+        minutes = settings.STOCK_RESERVATION_MINUTES
+    now = timezone.now()
+    expires_at = now + datetime.timedelta(minutes=minutes)
+    product_ids = list(quantities)
+
+    with transaction.atomic():
+        # Lazy expiry: only the lapsed holds on the products we touch
+        StockReservation.objects.filter(product_id__in=product_ids, expires_at__lte=now).delete()
+        stock = dict(Product.objects.filter(pk__in=product_ids, is_active=True).values_list('pk', 'stock'))
+        held = StockReservation.objects.held(product_ids, exclude_holder=holder)
+
+        rows, short = [], []
+        allowance = settings.STOCK_HOLD_MAX_PER_HOLDER
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                continue
+            free = max(stock[product_id] - held.get(product_id, 0), 0)
+            if free < quantity:
+                short.append(product_id)
+            units = min(quantity, free, settings.STOCK_HOLD_MAX_PER_LINE, allowance)
+            if units > 0:
+                allowance -= units
+                rows.append(StockReservation(
+                    holder=holder, product_id=product_id, quantity=units, expires_at=expires_at,
+                ))
+
+        StockReservation.objects.filter(holder=holder).exclude(
+            product_id__in=[row.product_id for row in rows]
+        ).delete()
+        if rows:
+            StockReservation.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['holder', 'product'],
+                update_fields=['quantity', 'expires_at'],
+            )
+    return Product.objects.filter(pk__in=short) if short else []
+
+
+def release(holder):
+    """Drop every hold of ``holder``."""
+    StockReservation.objects.filter(holder=holder).delete()
+
+
+def release_for(request):
+    """Drop the holds of the request's holder, if it ever got one."""
+    holder = request.session.get(HOLDER_SESSION_KEY)
+    if holder:
+        release(holder)
+
+
+def attach_available_stock(products):
+    """Load the holds for a list of products in one query (see Product.available_stock)."""
+    held = StockReservation.objects.held([product.pk for product in products])
+    for product in products:
+        product._held_stock = held.get(product.pk, 0)
+    return products
+
@@ -0,0 +1,183 @@
+# search.py
+"""
+Full-text product search.
+
+On SQLite products are mirrored into an FTS5 table (``ecommerce_product_fts``)
+kept in sync from Product saves and deletes. On PostgreSQL the same weighted
+document is a GIN-indexed tsvector expression, so nothing has to be synced.
+Both rank with field weights name > keywords > description. Any other backend
+(or SQLite built without FTS5) falls back to ``icontains`` filtering.
+"""
+import re
+import unicodedata
+
+from django.db import DatabaseError, connection, models
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'ecommerce_product_fts'
+PG_INDEX = 'ecommerce_product_search_idx'
+
+# bm25 weights for the (name, keywords, description) columns
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Letters and digits, plus the whole Bengali block so vowel signs, virama and
+# nukta (Unicode category M*, which \w does not match) stay inside the word.
+TOKEN_RE = re.compile(r'[\w\u0980-\u09FF]+')
+
+# Zero-width (non-)joiners change rendering only, not the word, and Bengali
+# digits are folded to ASCII so "৫০০" and "500" match each other.
+NORMALIZE_MAP = dict.fromkeys(map(ord, '\u200c\u200d\ufeff'))
+NORMALIZE_MAP.update({0x09E6 + digit: str(digit) for digit in range(10)})
+
+BENGALI_VIRAMA = '\u09cd'
+
+FTS_CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "name, keywords, description, "
+    "tokenize = \"unicode61 remove_diacritics 0 categories 'L* M* N* Co'\")"
+)
+FTS_DROP_SQL = f'DROP TABLE IF EXISTS {FTS_TABLE}'
+
+PG_DOCUMENT_TEMPLATE = (
+    "setweight(to_tsvector('simple', coalesce({table}name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce({table}meta_keywords, '') || ' ' || coalesce({table}brand, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce({table}description, '')), 'D')"
+)
+PG_DOCUMENT_SQL = PG_DOCUMENT_TEMPLATE.format(table='')
+PG_CREATE_SQL = f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON ecommerce_product USING GIN (({PG_DOCUMENT_SQL}))'
+PG_DROP_SQL = f'DROP INDEX IF EXISTS {PG_INDEX}'
+
+_fts_available = None
+
+
+def normalize(text):
+    """NFC-normalize, drop zero-width joiners, fold digits and casefold."""
+    text = unicodedata.normalize('NFC', text or '')
+    return text.translate(NORMALIZE_MAP).casefold()
+
+
+def normalize_query(text):
+    """Canonical form of a typed search, used to group SearchQuery counts."""
+    return ' '.join(normalize(text).split())
+
+
+def tokenize(text):
+    """Split Bengali/English text into normalized search tokens."""
+    return TOKEN_RE.findall(normalize(text))
+
+
+def index_terms(text):
+    """
+    Tokens to store in the index for ``text``.
+
+    Bengali compounds are written as one word (কাজুবাদাম = কাজু + বাদাম), so
+    besides each token we also index its suffixes starting at a letter that
+    is not part of a conjunct. Queries are matched as prefixes, which makes
+    "বাদাম" find "কাজুবাদাম" without a substring scan.
+    """
+    terms = []
+    for token in tokenize(text):
+        terms.append(token)
+        for i in range(1, len(token) - 1):
+            if (unicodedata.category(token[i]) == 'Lo'
+                    and '\u0980' <= token[i] <= '\u09ff'
+                    and token[i - 1] != BENGALI_VIRAMA):
+                terms.append(token[i:])
+    return terms
+
+
+def backend():
+    """Return 'fts5', 'postgres' or None when no full-text index is usable."""
+    global _fts_available
+    if connection.vendor == 'postgresql':
+        return 'postgres'
+    if connection.vendor != 'sqlite':
+        return None
+    if _fts_available is None:
+        try:
+            _fts_available = FTS_TABLE in connection.introspection.table_names()
+        except DatabaseError:
+            return None
+    return 'fts5' if _fts_available else None
+
+
+def _document(product):
+    keywords = ' '.join(filter(None, [product.meta_keywords, product.brand]))
+    return (
+        ' '.join(index_terms(product.name)),
+        ' '.join(index_terms(keywords)),
+        ' '.join(index_terms(product.description)),
+    )
+
+
+def index_product(product):
+    """Insert or refresh one product in the FTS table."""
+    if backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, keywords, description) VALUES (%s, %s, %s, %s)',
+            [product.pk, *_document(product)],
+        )
+
+
+def remove_product(pk):
+    if backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index(products):
+    """Replace the whole FTS table with ``products``; returns rows indexed."""
+    if backend() != 'fts5':
+        return 0
+    rows = [(product.pk, *_document(product)) for product in products]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, keywords, description) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+    return len(rows)
+
+
+def filter_by_search(queryset, query):
+    """
+    Restrict a Product ``queryset`` to full-text matches of ``query``,
+    annotated with ``search_rank`` (lower is better).
+
+    Every token must match (as a prefix, so partial words typed into the
+    search box still hit). The match is part of the listing query itself,
+    so category, price and stock filters apply before ranking and paging
+    and no match is lost to a cap. Returns None if no full-text backend is
+    available so callers can fall back to plain filtering.
+    """
+    engine = backend()
+    if engine is None:
+        return None
+
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    if engine == 'fts5':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        rank = RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            [match],
+            output_field=models.FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    # Qualified columns: the listing query may join tables with a "name" too
+    document = PG_DOCUMENT_TEMPLATE.format(table=f'{table}.')
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    matches = RawSQL(f"({document}) @@ to_tsquery('simple', %s)", [tsquery], output_field=models.BooleanField())
+    rank = RawSQL(f"-ts_rank(({document}), to_tsquery('simple', %s))", [tsquery], output_field=models.FloatField())
+    return queryset.filter(matches).annotate(search_rank=rank)
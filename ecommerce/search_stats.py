@@ -0,0 +1,107 @@
+# search_stats.py
+"""
+Buffered search-term counting for trending searches.
+
+Searches are tallied in a per-process buffer keyed by the normalized query.
+Every ``FLUSH_INTERVAL`` seconds or ``FLUSH_SIZE`` searches the buffer is
+handed to the job queue as one ``search.record_counts`` job, so the
+request pays for a single INSERT; the worker then writes the counts to
+SearchQuery in one bulk upsert (``write_counts``). Rows are created with
+``ignore_conflicts`` against the unique ``normalized_query`` index and then
+incremented with ``F()``, so jobs from different workers never duplicate a
+term or lose counts.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import SearchQuery
+from .search import normalize_query
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 30
+FLUSH_SIZE = 100
+
+_lock = threading.Lock()
+# normalized query -> [query as first typed, hits]
+_pending = {}
+_pending_hits = 0
+_last_flush = time.monotonic()
+
+
+def record_search(query):
+    """Count one search for ``query``; flushes when the buffer is due."""
+    global _pending_hits
+    query = ' '.join((query or '').split())[:200]
+    key = normalize_query(query)[:200]
+    if not key:
+        return
+
+    with _lock:
+        if key in _pending:
+            _pending[key][1] += 1
+        else:
+            _pending[key] = [query, 1]
+        _pending_hits += 1
+        due = _pending_hits >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL
+
+    if due:
+        flush()
+
+
+def _requeue(pending):
+    global _pending_hits
+    with _lock:
+        for key, (query, hits) in pending.items():
+            if key in _pending:
+                _pending[key][1] += hits
+            else:
+                _pending[key] = [query, hits]
+            _pending_hits += hits
+
+
+def flush():
+    """Queue the buffered counts for writing; returns the terms queued."""
+    global _pending, _pending_hits, _last_flush
+    with _lock:
+        pending, _pending = _pending, {}
+        _pending_hits = 0
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+
+    try:
+        enqueue('search.record_counts', counts=pending)
+    except DatabaseError as e:
+        # Keep the hits for the next flush rather than failing the request
+        logger.warning(f"Search stats flush failed: {e}")
+        _requeue(pending)
+        return 0
+    return len(pending)
+
+
+def write_counts(counts):
+    """Add ``{normalized query: [query, hits]}`` to SearchQuery; returns the rows updated."""
+    now = timezone.now()
+    with transaction.atomic():
+        SearchQuery.objects.bulk_create(
+            [SearchQuery(query=query, normalized_query=key, count=0)
+             for key, (query, hits) in counts.items()],
+            ignore_conflicts=True,
+        )
+        rows = list(SearchQuery.objects.filter(normalized_query__in=list(counts)).only('id', 'normalized_query'))
+        for row in rows:
+            row.count = models.F('count') + counts[row.normalized_query][1]
+            row.last_searched = now
+        SearchQuery.objects.bulk_update(rows, ['count', 'last_searched'])
+    return len(rows)
+
+
+# Don't drop the last partial buffer when a worker shuts down cleanly
+atexit.register(flush)
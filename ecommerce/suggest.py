@@ -0,0 +1,174 @@
+# suggest.py
+"""
+Search-box autocomplete.
+
+Suggestions come from a per-process prefix index over category names, brands,
+popular search terms and product names, so answering a keystroke never
+touches the database. The index is a sorted list of ``(key, entry id)``
+pairs searched with ``bisect``; every word of an entry (and every Bengali
+compound suffix, see ``search.index_terms``) starts a key, so "basm" finds
+"Miniket Basmati Rice".
+
+Entries are numbered best first (by kind, then weight), so the best matches
+for a prefix are simply the smallest ids in its key range. Results for one-
+and two-letter prefixes, whose ranges cover much of the catalog, are
+precomputed while building.
+
+The index is rebuilt lazily when the catalog version changes, and at least
+every ``SUGGEST_REFRESH_SECONDS`` so new popular searches show up.
+"""
+import bisect
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.db.models import Count, Q
+from django.urls import reverse
+
+from .catalog import get_catalog_version
+from .models import Category, Product, SearchQuery
+from .search import index_terms, tokenize
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 10
+# Prefixes up to this length get their results precomputed
+PRECOMPUTED_PREFIX_LENGTH = 2
+SUGGEST_REFRESH_SECONDS = 60 * 10
+POPULAR_SEARCHES = 200
+
+# Kinds in display order, with the most suggestions shown of each
+KIND_LIMITS = {
+    'category': 3,
+    'brand': 3,
+    'query': 3,
+    'product': MAX_LIMIT,
+}
+KIND_ORDER = {kind: rank for rank, kind in enumerate(KIND_LIMITS)}
+
+
+def _keys(text):
+    """Index keys for ``text``: every word-suffix of it plus compound suffixes."""
+    tokens = tokenize(text)
+    keys = {' '.join(tokens[i:]) for i in range(len(tokens))}
+    keys.update(index_terms(text))
+    keys.discard('')
+    return keys
+
+
+def _list_url(**params):
+    return f"{reverse('product_list')}?{urlencode(params)}"
+
+
+class SuggestIndex:
+    """Immutable prefix index; build with ``SuggestIndex.build()``."""
+
+    def __init__(self, entries):
+        # entries: (kind, weight, text, url)
+        entries = sorted(entries, key=lambda entry: (KIND_ORDER[entry[0]], -entry[1], entry[2]))
+        self.entries = [
+            {'text': text, 'type': kind, 'url': url}
+            for kind, weight, text, url in entries
+        ]
+        self.kinds = [entry['type'] for entry in self.entries]
+
+        keys = []
+        short = {}
+        for entry_id, entry in enumerate(self.entries):
+            for key in _keys(entry['text']):
+                keys.append((key, entry_id))
+                for length in range(1, min(len(key), PRECOMPUTED_PREFIX_LENGTH) + 1):
+                    short.setdefault(key[:length], set()).add(entry_id)
+        keys.sort()
+        self.keys = [key for key, entry_id in keys]
+        self.ids = [entry_id for key, entry_id in keys]
+        self.short = {prefix: self._select(ids, MAX_LIMIT) for prefix, ids in short.items()}
+
+    @classmethod
+    def build(cls):
+        entries = []
+
+        categories = Category.objects.filter(is_active=True).annotate(
+            product_count=Count('product', filter=Q(product__is_active=True))
+        )
+        for category in categories:
+            entries.append(('category', category.product_count, category.name,
+                            _list_url(category=category.slug)))
+
+        brands = (
+            Product.objects.filter(is_active=True).exclude(brand='')
+            .values_list('brand').annotate(count=Count('id'))
+        )
+        for brand, count in brands:
+            if brand:
+                entries.append(('brand', count, brand, _list_url(brand=brand)))
+
+        # Skip searches that just repeat a category or brand name
+        seen = {' '.join(tokenize(text)) for kind, weight, text, url in entries}
+        for query, count in SearchQuery.objects.order_by('-count').values_list('query', 'count')[:POPULAR_SEARCHES]:
+            normalized = ' '.join(tokenize(query))
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                entries.append(('query', count, query, _list_url(search=query)))
+
+        products = Product.objects.filter(is_active=True).values_list('name', 'slug', 'popularity_score')
+        for name, slug, score in products.iterator():
+            entries.append(('product', score, name, reverse('product_detail', args=[slug])))
+
+        return cls(entries)
+
+    def _select(self, entry_ids, limit):
+        """Best ``limit`` entries among ``entry_ids``, honouring KIND_LIMITS."""
+        picked = []
+        per_kind = dict.fromkeys(KIND_LIMITS, 0)
+        for entry_id in sorted(entry_ids):
+            kind = self.kinds[entry_id]
+            if per_kind[kind] < KIND_LIMITS[kind]:
+                per_kind[kind] += 1
+                picked.append(entry_id)
+                if len(picked) >= limit:
+                    break
+        return picked
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH:
+            picked = self.short.get(prefix, [])[:limit]
+        else:
+            start = bisect.bisect_left(self.keys, prefix)
+            # Every key starting with ``prefix`` sorts before prefix + U+10FFFF
+            end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+            picked = self._select(set(self.ids[start:end]), limit)
+        return [self.entries[entry_id] for entry_id in picked]
+
+
+_index = None
+_index_version = None
+_index_built_at = 0.0
+_build_lock = threading.Lock()
+
+
+def get_index():
+    """This process's index, rebuilt if the catalog changed or it got old."""
+    global _index, _index_version, _index_built_at
+    version = get_catalog_version()
+    if (_index is not None and _index_version == version
+            and time.monotonic() - _index_built_at < SUGGEST_REFRESH_SECONDS):
+        return _index
+
+    with _build_lock:
+        # Another thread may have rebuilt it while we waited
+        if (_index is None or _index_version != version
+                or time.monotonic() - _index_built_at >= SUGGEST_REFRESH_SECONDS):
+            _index = SuggestIndex.build()
+            _index_version = version
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    """Autocomplete suggestions for ``query`` as ``{'text', 'type', 'url'}`` dicts."""
+    return get_index().suggest(query, limit)
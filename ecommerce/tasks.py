@@ -0,0 +1,141 @@
+# tasks.py
+"""
+Job handlers, run by ``manage.py run_jobs`` (see jobs.py).
+
+Handlers take ids rather than objects and reload what they need, so a job
+always works on the current rows and its payload stays small JSON.
+"""
+import hashlib
+import json
+import urllib.request
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .jobs import enqueue, enqueue_many, task
+from .models import ContactMessage, Order, StoreSettings
+from .search_stats import write_counts
+
+
+def _store_email():
+    return StoreSettings.get_settings().contact_email
+
+
+def queue_order_placed(order):
+    """Queue the side effects of a new order; call inside the order's transaction."""
+    calls = [
+        ('order.confirmation_email', {'order_id': order.pk}),
+        ('order.admin_alert', {'order_id': order.pk}),
+    ]
+    if settings.FACEBOOK_PIXEL_ENABLED and settings.FACEBOOK_CAPI_ACCESS_TOKEN:
+        calls.append(('order.facebook_purchase', {'order_id': order.pk}))
+    enqueue_many(calls)
+
+
+def queue_contact_message(message):
+    enqueue('contact.admin_alert', message_id=message.pk)
+
+
+def _order_lines(order):
+    return '\n'.join(
+        f'{item.quantity} x {item.product.name} - ৳{item.price}' for item in order.items.all()
+    )
+
+
+@task('order.confirmation_email')
+def send_order_confirmation(order_id):
+    order = Order.objects.prefetch_related('items__product').filter(pk=order_id).first()
+    if order is None:
+        return
+    store = StoreSettings.get_settings()
+    send_mail(
+        f'অর্ডার #{order.order_number} নিশ্চিত হয়েছে - {store.store_name}',
+        f'প্রিয় {order.full_name},\n\n'
+        f'আপনার অর্ডার #{order.order_number} আমরা পেয়েছি।\n\n'
+        f'{_order_lines(order)}\n\n'
+        f'মোট: ৳{order.total_amount}\n'
+        f'ঠিকানা: {order.address}\n\n'
+        f'যেকোনো প্রয়োজনে যোগাযোগ করুন: {store.contact_phone}',
+        None,
+        [order.email],
+    )
+
+
+@task('order.admin_alert')
+def send_order_alert(order_id):
+    order = Order.objects.prefetch_related('items__product').filter(pk=order_id).first()
+    if order is None:
+        return
+    send_mail(
+        f'New order #{order.order_number} - ৳{order.total_amount}',
+        f'Customer: {order.full_name} ({order.phone}, {order.email})\n'
+        f'Address: {order.address}\n'
+        f'Instructions: {order.special_instructions or "-"}\n\n'
+        f'{_order_lines(order)}\n\n'
+        f'Total: ৳{order.total_amount}',
+        None,
+        [_store_email()],
+    )
+
+
+def _hash(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+@task('order.facebook_purchase')
+def send_facebook_purchase(order_id):
+    """Conversions API Purchase event, deduplicated against the browser pixel by order number."""
+    order = Order.objects.prefetch_related('items').filter(pk=order_id).first()
+    if order is None or not settings.FACEBOOK_CAPI_ACCESS_TOKEN:
+        return
+    items = list(order.items.all())
+    user_data = {'em': [_hash(order.email.strip().lower())]}
+    phone = ''.join(ch for ch in order.phone if ch.isdigit())
+    if phone:
+        user_data['ph'] = [_hash(phone)]
+    event = {
+        'event_name': 'Purchase',
+        'event_time': int(order.created_at.timestamp()),
+        'event_id': order.order_number,
+        'action_source': 'website',
+        'user_data': user_data,
+        'custom_data': {
+            'currency': 'BDT',
+            'value': float(order.total_amount),
+            'content_type': 'product',
+            'content_ids': [str(item.product_id) for item in items],
+            'contents': [{'id': str(item.product_id), 'quantity': item.quantity} for item in items],
+            'num_items': sum(item.quantity for item in items),
+        },
+    }
+    url = (
+        f'https://graph.facebook.com/{settings.FACEBOOK_GRAPH_API_VERSION}/'
+        f'{settings.FACEBOOK_PIXEL_ID}/events?access_token={settings.FACEBOOK_CAPI_ACCESS_TOKEN}'
+    )
+    request = urllib.request.Request(
+        url,
+        data=json.dumps({'data': [event]}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST',
+    )
+    # Non-2xx responses raise HTTPError, which retries the job
+    with urllib.request.urlopen(request, timeout=10):
+        pass
+
+
+@task('contact.admin_alert')
+def send_contact_alert(message_id):
+    message = ContactMessage.objects.filter(pk=message_id).first()
+    if message is None:
+        return
+    send_mail(
+        f'Contact form: {message.subject}',
+        f'From: {message.name} ({message.email}, {message.phone or "-"})\n\n{message.message}',
+        None,
+        [_store_email()],
+    )
+
+
+@task('search.record_counts')
+def record_search_counts(counts):
+    write_counts(counts)
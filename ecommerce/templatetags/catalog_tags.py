@@ -0,0 +1,83 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+from ecommerce.reservations import attach_available_stock
+
+register = template.Library()
+
+CARD_TEMPLATE = 'products/product_card.html'
+# Bump when product_card.html changes so old fragments are not served
+CARD_TEMPLATE_VERSION = 2
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+CARD_HITS_KEY = 'catalog:card:hits'
+CARD_MISSES_KEY = 'catalog:card:misses'
+
+
+def card_cache_key(product, language):
+    updated = int(product.updated_at.timestamp() * 1000000) if product.updated_at else 0
+    return f'catalog:card:{CARD_TEMPLATE_VERSION}:{product.pk}:{updated}:{product.available_stock}:{language}'
+
+
+def _count(key, amount):
+    if not amount:
+        return
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add() and incr(); losing one sample is fine
+        pass
+
+
+def card_cache_stats():
+    """Hit/miss counters shared by all workers, for monitoring"""
+    hits = cache.get(CARD_HITS_KEY, 0)
+    misses = cache.get(CARD_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+
+def reset_card_cache_stats():
+    cache.delete_many([CARD_HITS_KEY, CARD_MISSES_KEY])
+
+
+@register.simple_tag
+def product_cards(products):
+    """
+    Render product cards, reusing cached HTML per (product, updated_at,
+    available stock, language).
+
+    A grid costs one query for the stock holds, one cache get_many and
+    rendering only the cards that changed since they were last cached.
+    """
+    products = list(products)
+    if not products:
+        return ''
+    attach_available_stock(products)
+
+    language = translation.get_language() or ''
+    keys = [card_cache_key(product, language) for product in products]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    card_template = None
+    for key, product in zip(keys, products):
+        if key not in cached:
+            if card_template is None:
+                card_template = get_template(CARD_TEMPLATE)
+            missing[key] = card_template.render({'product': product})
+    if missing:
+        cache.set_many(missing, CARD_CACHE_TIMEOUT)
+
+    _count(CARD_HITS_KEY, len(products) - len(missing))
+    _count(CARD_MISSES_KEY, len(missing))
+
+    return mark_safe(''.join(cached.get(key) or missing[key] for key in keys))
@@ -1,3 +1,813 @@
-from django.test import TestCase
+import datetime
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core import signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cache_versions, coupons, jobs, popularity, reservations, search, views
+from .cart import CART_COOKIE, CART_COOKIE_AGE, CART_COOKIE_SALT, MAX_BATCH_OPERATIONS, merge_guest_cart
+from .catalog import CatalogQuery
+from .checkout import CheckoutError, OutOfStock, place_order
+from .models import (
+    Cart, CartItem, Category, ContactMessage, Coupon, Job, Order, OrderItem, OrderNumberSequence, Product,
+    StockReservation,
+)
+from .pagination import InvalidCursor, KeysetPaginator, apply_sort, decode_cursor, encode_cursor
+
+# Keep tests off the shared file cache
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_product(category, name, price='100.00', stock=10, **kwargs):
+    kwargs.setdefault('description', f'{name} description')
+    return Product.objects.create(
+        name=name,
+        slug=name.lower().replace(' ', '-'),
+        price=Decimal(price),
+        category=category,
+        image='products/test.jpg',
+        stock=stock,
+        **kwargs
+    )
+
+
+def guest_request(pairs):
+    """A guest request with a session and a signed cart cookie holding ``pairs``."""
+    request = RequestFactory().get('/')
+    SessionMiddleware(lambda request: None).process_request(request)
+    request.user = AnonymousUser()
+    request.COOKIES[CART_COOKIE] = signing.dumps(pairs, salt=CART_COOKIE_SALT, compress=True)
+    return request
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StoreTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Nuts', slug='nuts')
+
+
+class CursorPaginationTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = [make_product(self.category, f'Almond {i}', price=f'{100 + i}.00') for i in range(5)]
+
+    def test_cursor_round_trip(self):
+        queryset, ordering = apply_sort(Product.objects.all(), 'price_low')
+        paginator = KeysetPaginator(queryset, ordering, per_page=2)
+        seen = []
+        page = paginator.page()
+        seen += [product.pk for product in page]
+        while page.has_more:
+            page = paginator.page(page.next_cursor)
+            seen += [product.pk for product in page]
+        self.assertEqual(seen, [product.pk for product in self.products])
+
+    def test_tampered_cursor_is_rejected(self):
+        ordering = apply_sort(Product.objects.all(), 'price_low')[1]
+        cursor = encode_cursor(ordering, self.products[0])
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(ordering, cursor[:-2] + ('A' if cursor[-2] != 'A' else 'B') + cursor[-1])
+
+    def test_cursor_for_another_sort_is_rejected(self):
+        cursor = encode_cursor(apply_sort(Product.objects.all(), 'price_low')[1], self.products[0])
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(apply_sort(Product.objects.all(), 'name')[1], cursor)
+
+    def test_cached_page_skips_products_deactivated_since(self):
+        query = CatalogQuery(sort='price_low')
+        query.listing()
+        # No signal, so the cached listing still holds both products
+        gone = {self.products[2].pk, self.products[3].pk}
+        Product.objects.filter(pk__in=gone).update(is_active=False)
+        pages = [query.page(per_page=2)]
+        while pages[-1].has_more and len(pages) < 5:
+            pages.append(query.page(pages[-1].next_cursor, per_page=2))
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        seen = [product.pk for page in pages for product in page]
+        self.assertEqual(seen, [product.pk for product in self.products if product.pk not in gone])
+
+    def test_load_more_endpoint(self):
+        ordering = apply_sort(Product.objects.all(), 'price_low')[1]
+        cursor = encode_cursor(ordering, self.products[1])
+        response = self.client.get(reverse('load_more_products'), {'cursor': cursor, 'sort': 'price_low', 'per_page': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['loaded_count'], 2)
+        self.assertTrue(data['has_more'])
+        self.assertIn(self.products[2].name, data['products_html'])
+        self.assertNotIn(self.products[1].name, data['products_html'])
+
+
+class FilteredSearchTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        # More inactive matches than any page or old cap, all ranking above the target
+        Product.objects.bulk_create([
+            Product(name=f'Cashew {i}', slug=f'cashew-{i}', description='cashew', price='100.00',
+                    category=self.category, image='products/test.jpg', is_active=False)
+            for i in range(350)
+        ])
+        seeds = Category.objects.create(name='Seeds', slug='seeds')
+        self.target = make_product(
+            seeds, 'Roasted Cashew Mix', price='900.00',
+            description='A long description of a mix with some cashew among other roasted seeds and nuts',
+        )
+        search.rebuild_index(Product.objects.all())
+
+    def test_filters_apply_before_ranking(self):
+        if search.backend() is None:
+            self.skipTest('No full-text backend')
+        results = list(CatalogQuery(search='cashew', category='seeds', price_range='500-1000').queryset())
+        self.assertEqual(results, [self.target])
+
+    def test_inactive_matches_do_not_hide_active_ones(self):
+        if search.backend() is None:
+            self.skipTest('No full-text backend')
+        listing = CatalogQuery(search='cashew').listing()
+        self.assertEqual(listing['ids'], [self.target.pk])
+        self.assertEqual(listing['total'], 1)
+
+    def test_relevance_pages_past_the_first_results(self):
+        if search.backend() is None:
+            self.skipTest('No full-text backend')
+        Product.objects.filter(name__startswith='Cashew ').update(is_active=True)
+        query = CatalogQuery(search='cashew')
+        seen = []
+        page = KeysetPaginator(query.queryset(), query.ordering, per_page=100).page()
+        seen += [product.pk for product in page]
+        while page.has_more:
+            page = KeysetPaginator(query.queryset(), query.ordering, per_page=100).page(page.next_cursor)
+            seen += [product.pk for product in page]
+        self.assertEqual(len(seen), 351)
+        self.assertEqual(len(set(seen)), 351)
+
+
+class ProductPricingTests(StoreTestCase):
+    # Prices whose percentage off comes out a hair under a whole number in float maths
+    PRICES = [('100.10', '90.09'), ('19.90', '17.91'), ('0.30', '0.27'), ('250.00', '199.99')]
+
+    def test_save_and_bulk_update_store_the_same_discount(self):
+        for price, discount_price in self.PRICES:
+            price, discount_price = Decimal(price), Decimal(discount_price)
+            with self.subTest(price=price, discount_price=discount_price):
+                saved = make_product(self.category, f'Saved {price}', price=price, discount_price=discount_price)
+                updated = make_product(self.category, f'Updated {price}', price='1.00')
+                Product.objects.filter(pk=updated.pk).update(price=price, discount_price=discount_price)
+                saved.refresh_from_db()
+                updated.refresh_from_db()
+                self.assertEqual(saved.discount_percent, updated.discount_percent)
+                self.assertEqual(updated.discount_percent, updated.sale_percentage)
+
+    def test_no_discount_without_a_lower_price(self):
+        product = make_product(self.category, 'Almond', price=Decimal('100.00'), discount_price=Decimal('120.00'))
+        Product.objects.filter(pk=product.pk).update(price=Decimal('90.00'))
+        product.refresh_from_db()
+        self.assertEqual((product.effective_price, product.discount_percent), (Decimal('90.00'), 0))
+
+
+class ProductCardCacheTests(StoreTestCase):
+    def render_cards(self):
+        template = Template('{% load catalog_tags %}{% product_cards products %}')
+        return template.render(Context({'products': Product.objects.all()}))
+
+    def test_bulk_price_update_rerenders_the_card(self):
+        product = make_product(self.category, 'Almond', price='100.00')
+        # Well clear of the update below, whatever the clock resolution
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertIn('৳100.00', self.render_cards())
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=product.pk).update(price=Decimal('120.00'), discount_price=None)
+        html = self.render_cards()
+        self.assertIn('৳120.00', html)
+        self.assertNotIn('৳100.00', html)
+
+    def test_bulk_price_update_invalidates_cached_listings(self):
+        make_product(self.category, 'Almond', price='100.00')
+        make_product(self.category, 'Cashew', price='250.00')
+        query = CatalogQuery(sort='price_low')
+        self.assertEqual(query.listing()['total'], 2)
+        cashew = Product.objects.get(name='Cashew')
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=cashew.pk).update(price=Decimal('50.00'))
+        self.assertEqual(query.listing()['ids'][0], cashew.pk)
+
+
+class CartTotalsTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.almond = make_product(self.category, 'Almond', price='100.00')
+        self.cashew = make_product(self.category, 'Cashew', price='250.00')
+        self.cart = Cart.objects.create(session_key='test')
+        CartItem.objects.create(cart=self.cart, product=self.almond, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.cashew, quantity=1)
+
+    def test_totals_follow_item_writes(self):
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (3, 450))
+
+    def test_deleting_a_product_refreshes_carts(self):
+        self.cashew.delete()
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (2, 200))
+
+    def test_deleting_a_category_refreshes_carts(self):
+        self.category.delete()
+        self.cart.refresh_from_db()
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (0, 0))
+
+    def assertTotalsMatchLines(self, cart):
+        cart.refresh_from_db()
+        lines = [(item.quantity, item.product.effective_price) for item in cart.items.select_related('product')]
+        expected = (sum(quantity for quantity, _ in lines), sum(quantity * price for quantity, price in lines))
+        self.assertEqual((cart.item_count, cart.subtotal), expected)
+
+    def test_totals_follow_price_changes(self):
+        self.almond.discount_price = Decimal('80.00')
+        self.almond.save()
+        self.assertTotalsMatchLines(self.cart)
+        Product.objects.filter(pk=self.cashew.pk).update(price=Decimal('300.00'))
+        self.assertTotalsMatchLines(self.cart)
+        self.assertEqual(self.cart.subtotal, 460)
+
+    def test_totals_follow_item_changes_and_deletes(self):
+        self.cart.items.filter(product=self.almond).update(quantity=5)
+        self.assertTotalsMatchLines(self.cart)
+        self.cart.items.get(product=self.cashew).delete()
+        self.assertTotalsMatchLines(self.cart)
+        self.cart.items.all().delete()
+        self.assertTotalsMatchLines(self.cart)
+        self.assertEqual((self.cart.item_count, self.cart.subtotal), (0, 0))
+
+    def test_totals_follow_a_merge(self):
+        user = User.objects.create_user('shopper', password='secret')
+        user_cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=user_cart, product=self.almond, quantity=1)
+        merge_guest_cart(guest_request([[self.almond.pk, 2], [self.cashew.pk, 1]]), user)
+        self.assertTotalsMatchLines(user_cart)
+        self.assertEqual((user_cart.item_count, user_cart.subtotal), (4, 550))
+
+    def test_repair_command_fixes_corrupted_totals(self):
+        other = Cart.objects.create(session_key='other')
+        CartItem.objects.create(cart=other, product=self.almond, quantity=1)
+        Cart.objects.filter(pk=self.cart.pk).update(item_count=99, subtotal=Decimal('1.00'))
+
+        out = StringIO()
+        call_command('repair_cart_totals', '--check', stdout=out)
+        self.assertIn(f'Cart {self.cart.pk}: items 99 -> 3', out.getvalue())
+        self.assertNotIn(f'Cart {other.pk}:', out.getvalue())
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 99)
+
+        out = StringIO()
+        call_command('repair_cart_totals', stdout=out)
+        self.assertIn('Repaired totals of 1 carts', out.getvalue())
+        self.assertTotalsMatchLines(self.cart)
+        self.assertTotalsMatchLines(other)
+
+
+class CookieCartTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.almond = make_product(self.category, 'Almond', price='100.00')
+        self.cashew = make_product(self.category, 'Cashew', price='250.00')
+
+    def set_cart_cookie(self, pairs):
+        self.client.cookies[CART_COOKIE] = signing.dumps(pairs, salt=CART_COOKIE_SALT, compress=True)
+
+    def cookie_quantities(self, response):
+        value = response.cookies[CART_COOKIE].value
+        return dict(signing.loads(value, salt=CART_COOKIE_SALT)) if value else {}
+
+    def assertCookieDeleted(self, response):
+        self.assertEqual(response.cookies[CART_COOKIE].value, '')
+        self.assertEqual(response.cookies[CART_COOKIE]['max-age'], 0)
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name), data, content_type='application/json')
+
+    def test_guest_add_only_writes_the_cookie(self):
+        response = self.post('add_to_cart', product_id=self.almond.pk, quantity=2)
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(self.cookie_quantities(response), {self.almond.pk: 2})
+        self.assertFalse(Cart.objects.exists())
+
+    def test_tampered_cookie_resets_the_cart(self):
+        self.set_cart_cookie([[self.almond.pk, 2]])
+        value = self.client.cookies[CART_COOKIE].value
+        self.client.cookies[CART_COOKIE] = value[:-1] + ('A' if value[-1] != 'A' else 'B')
+        response = self.client.get(reverse('get_cart_data'))
+        self.assertEqual(response.json()['cart_items_count'], 0)
+        self.assertCookieDeleted(response)
+
+    def test_expired_cookie_resets_the_cart(self):
+        signed_at = time.time() - CART_COOKIE_AGE - 60
+        with mock.patch('django.core.signing.time.time', return_value=signed_at):
+            self.set_cart_cookie([[self.almond.pk, 2]])
+        response = self.client.get(reverse('get_cart_data'))
+        self.assertEqual(response.json()['cart_items_count'], 0)
+        self.assertCookieDeleted(response)
+
+    def test_lines_are_capped(self):
+        with mock.patch('ecommerce.cart.MAX_COOKIE_LINES', 1):
+            self.post('add_to_cart', product_id=self.almond.pk, quantity=1)
+            full = self.post('add_to_cart', product_id=self.cashew.pk, quantity=1)
+            self.assertFalse(full.json()['success'])
+            more = self.post('add_to_cart', product_id=self.almond.pk, quantity=2)
+        self.assertTrue(more.json()['success'])
+        self.assertEqual(self.cookie_quantities(more), {self.almond.pk: 3})
+
+    def test_deactivated_products_are_dropped_on_load(self):
+        self.set_cart_cookie([[self.almond.pk, 2], [self.cashew.pk, 1]])
+        Product.objects.filter(pk=self.cashew.pk).update(is_active=False)
+        response = self.client.get(reverse('get_cart_data'), {'html': 1})
+        self.assertEqual(response.json()['cart_items_count'], 2)
+        self.assertEqual(response.json()['cart_total'], 200)
+        self.assertEqual(self.cookie_quantities(response), {self.almond.pk: 2})
+
+    def test_emptied_cart_deletes_the_cookie(self):
+        self.set_cart_cookie([[self.almond.pk, 2]])
+        response = self.post('remove_from_cart', item_id=self.almond.pk)
+        self.assertTrue(response.json()['success'])
+        self.assertCookieDeleted(response)
+
+
+class CookieCartBatchTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.almond = make_product(self.category, 'Almond', price='100.00')
+        self.cashew = make_product(self.category, 'Cashew', price='250.00')
+
+    def quantities(self):
+        cookie = self.client.cookies.get(CART_COOKIE)
+        return dict(signing.loads(cookie.value, salt=CART_COOKIE_SALT)) if cookie and cookie.value else {}
+
+    def batch(self, *operations):
+        response = self.client.post(
+            reverse('cart_batch'), {'operations': list(operations), 'mode': 'delta'}, content_type='application/json',
+        )
+        return response.json()
+
+    def test_add_set_and_remove(self):
+        data = self.batch({'op': 'add', 'product_id': self.almond.pk, 'quantity': 2})
+        self.assertEqual(self.quantities(), {self.almond.pk: 2})
+        line_id = data['lines'][0]['id']
+
+        data = self.batch(
+            {'op': 'add', 'product_id': self.cashew.pk},
+            {'op': 'set', 'item_id': line_id, 'quantity': 5},
+        )
+        self.assertEqual(self.quantities(), {self.almond.pk: 5, self.cashew.pk: 1})
+        self.assertEqual((data['cart_items_count'], data['cart_total']), (6, 750))
+
+        data = self.batch({'op': 'remove', 'item_id': line_id}, {'op': 'set', 'product_id': self.cashew.pk, 'quantity': 3})
+        self.assertEqual(self.quantities(), {self.cashew.pk: 3})
+        self.assertEqual((data['cart_items_count'], data['cart_total']), (3, 750))
+
+    def test_too_many_operations_are_rejected(self):
+        data = self.batch(*[{'op': 'add', 'product_id': self.almond.pk}] * (MAX_BATCH_OPERATIONS + 1))
+        self.assertFalse(data['success'])
+        self.assertEqual(self.quantities(), {})
+
+    def test_unknown_operation_applies_nothing(self):
+        self.batch({'op': 'add', 'product_id': self.almond.pk})
+        data = self.batch({'op': 'add', 'product_id': self.cashew.pk}, {'op': 'double', 'product_id': self.almond.pk})
+        self.assertFalse(data['success'])
+        self.assertEqual(self.quantities(), {self.almond.pk: 1})
+
+    def test_missing_product_applies_nothing(self):
+        self.batch({'op': 'add', 'product_id': self.almond.pk})
+        inactive = make_product(self.category, 'Walnut', is_active=False)
+        for missing in (inactive.pk, inactive.pk + 100):
+            with self.subTest(product_id=missing):
+                data = self.batch(
+                    {'op': 'set', 'product_id': self.almond.pk, 'quantity': 4},
+                    {'op': 'add', 'product_id': missing},
+                    {'op': 'add', 'product_id': self.cashew.pk},
+                )
+                self.assertFalse(data['success'])
+                self.assertEqual(self.quantities(), {self.almond.pk: 1})
+
+
+class DatabaseCartBatchTests(CookieCartBatchTests):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('shopper', password='secret')
+        self.client.force_login(self.user)
+
+    def quantities(self):
+        cart = Cart.objects.filter(user=self.user).first()
+        if cart is None:
+            return {}
+        lines = dict(cart.items.values_list('product_id', 'quantity'))
+        self.assertEqual(cart.item_count, sum(lines.values()))
+        return lines
+
+
+class MergeGuestCartTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.almond = make_product(self.category, 'Almond', price='100.00')
+        self.user = User.objects.create_user('shopper', password='secret')
+
+    def test_merge_creates_a_single_user_cart(self):
+        merge_guest_cart(guest_request([[self.almond.pk, 2]]), self.user)
+        merge_guest_cart(guest_request([[self.almond.pk, 1]]), self.user)
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(cart.item_count, 3)
+        self.assertEqual(cart.items.get().quantity, 3)
+
+    def test_a_user_cannot_have_two_carts(self):
+        Cart.objects.create(user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+
+
+class OrderTestCase(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.almond = make_product(self.category, 'Almond', price='100.00', stock=3)
+
+    def cart_with(self, quantity, product=None):
+        cart = Cart.objects.create(session_key='test')
+        CartItem.objects.create(cart=cart, product=product or self.almond, quantity=quantity)
+        return cart
+
+    def new_order(self):
+        return Order(full_name='Test Buyer', email='buyer@example.com', phone='01700000000', address='Dhaka')
+
+
+class PlaceOrderTests(OrderTestCase):
+    def test_order_takes_stock(self):
+        order = place_order(self.new_order(), self.cart_with(2))
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 1)
+        self.assertEqual(order.total_amount, 200)
+        self.assertEqual(order.items.get().quantity, 2)
+
+    def test_stock_is_never_oversold(self):
+        first, second = self.cart_with(2), self.cart_with(2)
+        place_order(self.new_order(), first)
+        with self.assertRaises(OutOfStock):
+            place_order(self.new_order(), second)
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 1)
+        self.assertEqual(Order.objects.count(), 1)
+        # The failed order left its cart alone
+        self.assertEqual(second.items.count(), 1)
+
+    def test_failed_line_rolls_back_the_whole_order(self):
+        cashew = make_product(self.category, 'Cashew', price='250.00', stock=0)
+        cart = self.cart_with(1)
+        CartItem.objects.create(cart=cart, product=cashew, quantity=1)
+        with self.assertRaises(OutOfStock):
+            place_order(self.new_order(), cart)
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 3)
+        self.assertFalse(Order.objects.exists())
+
+    def test_empty_cart_is_rejected(self):
+        with self.assertRaises(CheckoutError):
+            place_order(self.new_order(), Cart.objects.create(session_key='empty'))
+
+
+class OrderNumberTests(OrderTestCase):
+    def place(self):
+        return place_order(self.new_order(), self.cart_with(1)).order_number
+
+    def test_numbers_are_dated_and_sequential(self):
+        prefix = f'{timezone.localdate():%y%m%d}-'
+        self.assertEqual([self.place(), self.place()], [f'{prefix}00001', f'{prefix}00002'])
+
+    def test_counter_restarts_each_day(self):
+        days = [datetime.date(2026, 3, 1), datetime.date(2026, 3, 1), datetime.date(2026, 3, 2)]
+        with mock.patch('ecommerce.models.timezone.localdate', side_effect=days):
+            numbers = [OrderNumberSequence.next_order_number() for _ in days]
+        self.assertEqual(numbers, ['260301-00001', '260301-00002', '260302-00001'])
+
+    def test_rolled_back_order_leaves_no_gap(self):
+        first = self.place()
+        with mock.patch('ecommerce.checkout.queue_order_placed', side_effect=RuntimeError('queue down')):
+            with self.assertRaises(RuntimeError):
+                self.place()
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(int(self.place()[-5:]), int(first[-5:]) + 1)
+
+
+class PopularityTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cashew = make_product(self.category, 'Cashew', price='250.00')
+
+    def sell(self, product, quantity, days_ago=0, status='pending'):
+        order = self.new_order()
+        order.total_amount = Decimal(product.price) * quantity
+        order.status = status
+        order.save()
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - datetime.timedelta(days=days_ago))
+
+    def popular(self):
+        queryset, ordering = apply_sort(Product.objects.all(), 'popular')
+        return list(queryset.order_by(*ordering))
+
+    def test_recent_sale_outranks_an_older_larger_one(self):
+        self.sell(self.cashew, 5, days_ago=3 * popularity.HALF_LIFE_DAYS)
+        self.sell(self.almond, 2)
+        popularity.recompute_scores()
+        self.assertEqual(self.popular(), [self.almond, self.cashew])
+
+    def test_checkout_adds_the_same_weight_as_a_rebuild(self):
+        place_order(self.new_order(), self.cart_with(2))
+        self.almond.refresh_from_db()
+        live_score = self.almond.popularity_score
+        popularity.recompute_scores()
+        self.almond.refresh_from_db()
+        self.assertAlmostEqual(self.almond.popularity_score / live_score, 1, places=6)
+
+    def test_rebuild_skips_cancelled_orders(self):
+        self.sell(self.cashew, 5, status='cancelled')
+        self.sell(self.almond, 1, days_ago=2 * popularity.HALF_LIFE_DAYS)
+        Product.objects.filter(pk=self.cashew.pk).update(popularity_score=1e9)
+        popularity.recompute_scores()
+        self.cashew.refresh_from_db()
+        self.assertEqual(self.cashew.popularity_score, 0)
+        self.assertEqual(self.popular(), [self.almond, self.cashew])
+
+
+class CouponTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.coupon = Coupon.objects.create(
+            code='SAVE10', discount_type='percentage', discount_value=10,
+            valid_from=now - datetime.timedelta(days=1), valid_to=now + datetime.timedelta(days=1),
+            usage_limit=1,
+        )
+
+    def test_quote_is_case_insensitive(self):
+        coupon, discount = coupons.quote(' save10 ', 200)
+        self.assertEqual((coupon.pk, discount), (self.coupon.pk, 20))
+
+    def test_redeem_stops_at_the_usage_limit(self):
+        coupons.redeem(self.coupon)
+        with self.assertRaises(coupons.CouponError):
+            coupons.redeem(self.coupon)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 1)
+
+    def test_used_up_coupon_fails_the_order(self):
+        order = place_order(self.new_order(), self.cart_with(1), coupon_code='SAVE10')
+        self.assertEqual(order.total_amount, 90)
+        with self.assertRaises(CheckoutError):
+            # The cached definition still says unused; redeem() is what decides
+            place_order(self.new_order(), self.cart_with(1), coupon_code='SAVE10')
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 2)
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.used_count, 1)
+
+    def test_coupon_edit_drops_the_cached_definition(self):
+        coupons.quote('SAVE10', 200)
+        self.coupon.discount_value = 20
+        self.coupon.save()
+        self.assertEqual(coupons.quote('SAVE10', 200)[1], 40)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CacheVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_changes_the_version_for_every_reader(self):
+        version = cache_versions.get_version('test:version')
+        self.assertEqual(cache_versions.get_version('test:version'), version)
+        self.assertNotEqual(cache_versions.bump_version('test:version'), version)
+        self.assertNotEqual(cache_versions.get_version('test:version'), version)
+
+    def test_evicted_version_does_not_come_back(self):
+        version = cache_versions.get_version('test:version')
+        cache.delete('test:version')
+        self.assertGreater(cache_versions.bump_version('test:version'), version)
+
+
+@override_settings(STOCK_HOLD_MAX_PER_LINE=5, STOCK_HOLD_MAX_PER_HOLDER=8)
+class StockReservationTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk=self.almond.pk).update(stock=10)
+        self.cashew = make_product(self.category, 'Cashew', price='250.00', stock=10)
+
+    def available(self, product):
+        return Product.objects.get(pk=product.pk).available_stock
+
+    def test_hold_reduces_available_stock(self):
+        reservations.hold('alice', {self.almond.pk: 3})
+        self.assertEqual(self.available(self.almond), 7)
+
+    def test_holds_are_capped_per_line_and_per_holder(self):
+        reservations.hold('alice', {self.almond.pk: 10, self.cashew.pk: 10})
+        held = dict(StockReservation.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(held, {self.almond.pk: 5, self.cashew.pk: 3})
+        self.assertEqual(self.available(self.almond), 5)
+
+    def test_expired_holds_count_for_nothing(self):
+        reservations.hold('alice', {self.almond.pk: 5})
+        StockReservation.objects.update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(self.available(self.almond), 10)
+        # Holding the product again clears the lapsed row
+        reservations.hold('bob', {self.almond.pk: 1})
+        self.assertEqual(list(StockReservation.objects.values_list('holder', flat=True)), ['bob'])
+
+    def test_short_reports_products_held_by_others(self):
+        Product.objects.filter(pk=self.almond.pk).update(stock=4)
+        reservations.hold('alice', {self.almond.pk: 3})
+        short = reservations.hold('bob', {self.almond.pk: 2})
+        self.assertEqual(list(short), [self.almond])
+
+    def test_order_cannot_take_stock_held_by_others(self):
+        Product.objects.filter(pk=self.almond.pk).update(stock=4)
+        reservations.hold('alice', {self.almond.pk: 3})
+        with self.assertRaises(OutOfStock):
+            place_order(self.new_order(), self.cart_with(2), holder='bob')
+        place_order(self.new_order(), self.cart_with(3), holder='alice')
+        self.assertFalse(StockReservation.objects.exists())
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 1)
+
+    def test_emptying_the_cart_releases_its_holds(self):
+        reservations.hold('bob', {self.almond.pk: 1})
+        user = User.objects.create_user('shopper', password='secret')
+        for login in (False, True):
+            with self.subTest(logged_in=login):
+                client = self.client_class()
+                if login:
+                    client.force_login(user)
+
+                def post(name, **data):
+                    return client.post(reverse(name), data, content_type='application/json')
+
+                post('add_to_cart', product_id=self.almond.pk, quantity=2)
+                post('add_to_cart', product_id=self.cashew.pk, quantity=1)
+                client.get(reverse('checkout'))
+                self.assertEqual(self.available(self.almond), 7)
+
+                line_ids = [line['id'] for line in post('cart_batch', operations=[]).json()['lines']]
+                post('remove_from_cart', item_id=line_ids[0], mode='delta')
+                self.assertEqual(StockReservation.objects.exclude(holder='bob').count(), 2)
+                post('remove_from_cart', item_id=line_ids[1], mode='delta')
+                self.assertEqual(list(StockReservation.objects.values_list('holder', flat=True)), ['bob'])
+                self.assertEqual(self.available(self.almond), 9)
+
+
+class CheckoutViewTests(OrderTestCase):
+    def start_checkout(self, client=None, quantity=1):
+        client = client or self.client
+        client.cookies[CART_COOKIE] = signing.dumps([[self.almond.pk, quantity]], salt=CART_COOKIE_SALT, compress=True)
+        response = client.get(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        return response.context['checkout_token']
+
+    def submit(self, token, client=None):
+        return (client or self.client).post(reverse('checkout'), {
+            'full_name': 'Test Buyer',
+            'email': 'buyer@example.com',
+            'phone': '01700000000',
+            'address': 'Dhaka',
+            'checkout_token': token,
+        })
+
+    def test_guest_can_open_only_their_own_confirmation(self):
+        response = self.submit(self.start_checkout())
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('order_confirmation', args=[order.order_number]))
+        self.assertEqual(self.client.get(response.url).status_code, 200)
+
+        stranger = self.client_class()
+        self.assertEqual(stranger.get(response.url).status_code, 404)
+
+    def test_resubmitted_form_returns_the_first_order(self):
+        token = self.start_checkout()
+        first = self.submit(token)
+        second = self.submit(token)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(second.url, first.url)
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 2)
+
+    def test_racing_submission_returns_the_winners_order(self):
+        token = self.start_checkout()
+        first = self.submit(token)
+        # The second request passed the token check before the first committed
+        # and still carries the cart cookie
+        self.client.cookies[CART_COOKIE] = signing.dumps([[self.almond.pk, 1]], salt=CART_COOKIE_SALT, compress=True)
+        winner = Order.objects.get()
+        with mock.patch.object(views, '_order_for_token', side_effect=[None, winner]) as lookup:
+            second = self.submit(token)
+        # Looked up again after the unique token rejected the duplicate
+        self.assertEqual(lookup.call_count, 2)
+        self.assertEqual(second.url, first.url)
+        self.assertEqual(Order.objects.count(), 1)
+        self.almond.refresh_from_db()
+        self.assertEqual(self.almond.stock, 2)
+
+
+class ContactFormTests(StoreTestCase):
+    def test_invalid_submission_is_not_stored(self):
+        response = self.client.post(reverse('contact_us'), {'name': '', 'email': 'not-an-email'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertFalse(ContactMessage.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_valid_submission_queues_an_alert(self):
+        response = self.client.post(reverse('contact_us'), {
+            'name': 'Rahim', 'email': 'rahim@example.com', 'subject': 'order', 'message': 'Where is my order?',
+        })
+        self.assertRedirects(response, reverse('contact_us'))
+        message = ContactMessage.objects.get()
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload), ('contact.admin_alert', {'message_id': message.pk}))
+
+
+calls = []
+
+
+@jobs.task('test.flaky')
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError('temporary failure')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_due(self):
+        # Pretend the retry delay has passed
+        Job.objects.filter(status=Job.QUEUED).update(run_at=timezone.now())
+        return jobs.run_batch()
+
+    def test_failed_job_is_retried_with_backoff(self):
+        job = jobs.enqueue('test.flaky', fail_times=1)
+        before = timezone.now()
+        with self.assertLogs('ecommerce.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_batch(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('temporary failure', job.last_error)
+        self.assertGreaterEqual(job.run_at, before + datetime.timedelta(seconds=jobs.backoff(1)))
+        # Not due yet
+        self.assertEqual(jobs.run_batch(), 0)
+
+        self.assertEqual(self.run_due(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertEqual([jobs.backoff(n) for n in (1, 2, 3)], [30, 60, 120])
+        self.assertEqual(jobs.backoff(20), jobs.BACKOFF_MAX)
+
+    def test_job_fails_for_good_after_max_attempts(self):
+        job = jobs.enqueue('test.flaky', max_attempts=2, fail_times=5)
+        with self.assertLogs('ecommerce.jobs', 'WARNING') as logs:
+            jobs.run_batch()
+            self.run_due()
+        self.assertIn('failed for good', logs.output[-1])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(self.run_due(), 0)
+
+    def test_unknown_task_fails_without_retrying(self):
+        job = jobs.enqueue('test.missing')
+        with self.assertLogs('ecommerce.jobs', 'ERROR'):
+            jobs.run_batch()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_claimed_jobs_are_not_claimed_again(self):
+        jobs.enqueue('test.flaky', fail_times=0)
+        self.assertEqual(len(jobs.claim()), 1)
+        self.assertEqual(jobs.claim(), [])
+
+    def test_stale_running_job_is_requeued(self):
+        job = jobs.enqueue('test.flaky', fail_times=0)
+        jobs.claim()
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - jobs.LOCK_TIMEOUT * 2)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.run_batch(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
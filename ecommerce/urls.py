@@ -6,6 +6,8 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.product_list, name='product_list'),
+    # Before the slug route, which would otherwise take "load-more" as a slug
+    path('products/load-more/', views.load_more_products, name='load_more_products'),
     path('products/<slug:slug>/', views.product_detail, name='product_detail'),
     path('product/quick-view/<int:product_id>/', views.quick_view, name='quick_view'),
     
@@ -15,6 +17,7 @@ urlpatterns = [
     path('cart/update/', views.update_cart_item, name='update_cart_item'),
     path('cart/remove/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/data/', views.get_cart_data, name='get_cart_data'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     
     # Checkout URLs
     path('checkout/', views.checkout, name='checkout'),
@@ -32,8 +35,8 @@ urlpatterns = [
     
     # Additional URLs
     path('track-search/', views.track_search, name='track_search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('apply-coupon/', views.apply_coupon, name='apply_coupon'),
-    path('products/load-more/', views.load_more_products, name='load_more_products'),
     
     # Static Pages
     path('about-us/', views.about_us, name='about_us'),
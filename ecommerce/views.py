@@ -2,21 +2,32 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.conf import settings
 from django.views.decorators.http import require_POST
-from django.db import models
+from django.db import IntegrityError, transaction
 import json
-from .models import Product, Category, Cart, CartItem, Order, OrderItem, Coupon, SearchQuery, HeroSlider, Promotion, SpecialOffer
-from .forms import LoginForm, OrderForm
+import secrets
+from .models import Product, Category, Order, Coupon, HeroSlider, Promotion, SpecialOffer
+from .forms import ContactForm, LoginForm, OrderForm
+from .cart import get_cart, merge_guest_cart
+from .checkout import CheckoutError, place_order
+from .reservations import get_holder, hold as hold_stock
+from .coupons import CouponError, quote as quote_coupon
+from .catalog import PRICE_RANGE_LABELS, CatalogQuery
+from .facets import get_facets
+from .pagination import encode_cursor
+from .search_stats import record_search
+from .suggest import DEFAULT_LIMIT as SUGGEST_LIMIT, suggest
+from .tasks import queue_contact_message
 
 
 
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
     categories = Category.objects.filter(is_active=True)
     
     # Get filter parameters
-    category_slug = request.GET.get('category')
+    catalog_query = CatalogQuery.from_params(request.GET)
     search_query = request.GET.get('search')
     sort_by = request.GET.get('sort')
     min_price = request.GET.get('min_price')
@@ -27,115 +38,44 @@ def product_list(request):
     brand = request.GET.get('brand')
     
     current_category = None
+    if catalog_query.category:
+        current_category = Category.objects.filter(slug=catalog_query.category).first()
     
-    # Category filter
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-        current_category = Category.objects.filter(slug=category_slug).first()
+    # Track search query (buffered, written in bulk)
+    if catalog_query.search:
+        record_search(catalog_query.search)
     
-    # Search filter
-    if search_query:
-        products = products.filter(
-            models.Q(name__icontains=search_query) |
-            models.Q(description__icontains=search_query) |
-            models.Q(meta_keywords__icontains=search_query)
-        )
-        # Track search query
-        SearchQuery.objects.update_or_create(
-            query=search_query,
-            defaults={'count': models.F('count') + 1}
-        )
-    
-    # Price range filters
-    if price_range:
-        if price_range == '0-500':
-            products = products.filter(price__lte=500)
-        elif price_range == '500-1000':
-            products = products.filter(price__gte=500, price__lte=1000)
-        elif price_range == '1000-2000':
-            products = products.filter(price__gte=1000, price__lte=2000)
-        elif price_range == '2000+':
-            products = products.filter(price__gte=2000)
-    
-    # Custom price range
-    if min_price:
-        try:
-            products = products.filter(price__gte=float(min_price))
-        except ValueError:
-            pass
-    
-    if max_price:
-        try:
-            products = products.filter(price__lte=float(max_price))
-        except ValueError:
-            pass
-    
-    # Stock filter
-    if in_stock == 'true':
-        products = products.filter(stock__gt=0)
-    
-    # Sale filter
-    if on_sale == 'true':
-        products = products.filter(discount_price__isnull=False).exclude(
-            discount_price__gte=models.F('price')
-        )
-    
-    # Brand filter
-    if brand:
-        products = products.filter(brand__icontains=brand)
-    
-    # Sorting
-    if sort_by:
-        if sort_by == 'name':
-            products = products.order_by('name')
-        elif sort_by == 'price_low':
-            products = products.extra(
-                select={'effective_price': 'COALESCE(discount_price, price)'}
-            ).order_by('effective_price')
-        elif sort_by == 'price_high':
-            products = products.extra(
-                select={'effective_price': 'COALESCE(discount_price, price)'}
-            ).order_by('-effective_price')
-        elif sort_by == 'newest':
-            products = products.order_by('-created_at')
-        elif sort_by == 'popular':
-            # Order by stock descending as a proxy for popularity
-            products = products.order_by('-stock')
-        elif sort_by == 'discount':
-            products = products.filter(discount_price__isnull=False).extra(
-                select={'discount_percent': '((price - discount_price) / price) * 100'}
-            ).order_by('-discount_percent')
-    else:
-        # Default sorting
-        products = products.order_by('-created_at')
-    
-    # Get unique brands for filter
-    brands = Product.objects.filter(is_active=True).exclude(
-        brand__isnull=True
-    ).exclude(brand__exact='').values_list('brand', flat=True).distinct()
-    
-    # Get price range for filters
-    price_stats = Product.objects.filter(is_active=True).aggregate(
-        min_price=models.Min('price'),
-        max_price=models.Max('price')
-    )
+    # Sidebar brands, price bounds and counts come from the cached facets
+    facets = get_facets(catalog_query.category)
+    price_stats = {
+        'min_price': facets['min_price'],
+        'max_price': facets['max_price'],
+    }
+    categories = list(categories)
+    for category in categories:
+        category.product_count = facets['category_counts'].get(category.slug, 0)
     
     # Pagination for initial load
     products_per_page = 12
-    total_products = products.count()
-    initial_products = products[:products_per_page]
-    has_more = total_products > products_per_page
+    page = catalog_query.page(per_page=products_per_page)
     
     context = {
-        'products': initial_products,
+        'products': page.object_list,
         'categories': categories,
         'current_category': current_category,
         'search_query': search_query,
-        'has_more': has_more,
+        'has_more': page.has_more,
+        'next_cursor': page.next_cursor,
         'products_per_page': products_per_page,
-        'total_products': total_products,
-        'brands': brands,
+        'total_products': page.total,
+        'brands': facets['brands'],
         'price_stats': price_stats,
+        'facets': facets,
+        'price_range_options': [
+            (key, label, facets['price_ranges'][key])
+            for key, label in PRICE_RANGE_LABELS.items()
+        ],
+        'show_facet_counts': getattr(settings, 'CATALOG_FACET_COUNTS', False),
         # Current filter values for maintaining state
         'current_sort': sort_by,
         'current_price_range': price_range,
@@ -154,18 +94,33 @@ def product_detail(request, slug):
     }
     return render(request, 'products/detail.html', context)
 
-def get_cart(request):
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        session_key = request.session.session_key
-        cart, created = Cart.objects.get_or_create(session_key=session_key)
-    return cart
-
 from django.template.loader import render_to_string
 
+def _cart_response(request_data, cart, line_id, line=None, **extra):
+    """
+    JSON for a cart change: new totals plus either the changed line (when
+    the client sends ``"mode": "delta"``) or the whole sidebar HTML.
+    """
+    response = {
+        'success': True,
+        'cart_items_count': cart.item_count,
+        'cart_total': float(cart.subtotal),
+        **extra,
+    }
+    if request_data.get('mode') == 'delta':
+        response['line'] = {
+            'id': line_id,
+            'quantity': line.quantity if line else 0,
+            'total': float(line.total_price) if line else 0,
+            'removed': line is None,
+        }
+    else:
+        response['cart_items_html'] = render_to_string('cart/cart_items.html', {
+            'cart': cart,
+            'cart_items': cart.lines
+        })
+    return JsonResponse(response)
+
 @require_POST
 def add_to_cart(request):
     try:
@@ -175,34 +130,9 @@ def add_to_cart(request):
         
         product = get_object_or_404(Product, id=product_id, is_active=True)
         cart = get_cart(request)
+        cart_item = cart.add(product, quantity)
         
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        
-        # Get updated cart data
-        cart_items_count = cart.total_items
-        cart_total = cart.total_price
-        
-        # Render cart items HTML for sidebar
-        cart_items_html = render_to_string('cart/cart_items.html', {
-            'cart': cart,
-            'cart_items': cart.items.select_related('product')
-        })
-        
-        return JsonResponse({
-            'success': True,
-            'message': 'Product added to cart',
-            'cart_items_count': cart_items_count,
-            'cart_total': float(cart_total),
-            'cart_items_html': cart_items_html
-        })
+        return _cart_response(data, cart, cart_item.id, cart_item, message='Product added to cart')
         
     except Exception as e:
         return JsonResponse({
@@ -218,34 +148,14 @@ def update_cart_item(request):
         quantity = int(data.get('quantity', 1))
         
         cart = get_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        
-        if quantity <= 0:
-            cart_item.delete()
-            item_removed = True
-        else:
-            cart_item.quantity = quantity
-            cart_item.save()
-            item_removed = False
-        
-        # Get updated cart data
-        cart_items_count = cart.total_items
-        cart_total = cart.total_price
+        cart_item = cart.set_quantity(item_id, quantity)
+        item_removed = cart_item is None
         
-        # Render cart items HTML for sidebar
-        cart_items_html = render_to_string('cart/cart_items.html', {
-            'cart': cart,
-            'cart_items': cart.items.select_related('product')
-        })
-        
-        return JsonResponse({
-            'success': True,
-            'cart_items_count': cart_items_count,
-            'cart_total': float(cart_total),
-            'item_total': float(cart_item.total_price) if not item_removed else 0,
-            'item_removed': item_removed,
-            'cart_items_html': cart_items_html
-        })
+        return _cart_response(
+            data, cart, item_id, cart_item,
+            item_total=float(cart_item.total_price) if not item_removed else 0,
+            item_removed=item_removed,
+        )
         
     except Exception as e:
         return JsonResponse({
@@ -260,25 +170,41 @@ def remove_from_cart(request):
         item_id = data.get('item_id')
         
         cart = get_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        cart_item.delete()
+        cart.remove(item_id)
         
-        # Get updated cart data
-        cart_items_count = cart.total_items
-        cart_total = cart.total_price
+        return _cart_response(data, cart, item_id)
         
-        # Render cart items HTML for sidebar
-        cart_items_html = render_to_string('cart/cart_items.html', {
-            'cart': cart,
-            'cart_items': cart.items.select_related('product')
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
         })
+
+@require_POST
+def cart_batch(request):
+    """Apply several add/set/remove operations in one request"""
+    try:
+        data = json.loads(request.body)
+        operations = data.get('operations') or []
         
-        return JsonResponse({
+        cart = get_cart(request)
+        cart.apply(operations)
+        
+        response = {
             'success': True,
-            'cart_items_count': cart_items_count,
-            'cart_total': float(cart_total),
-            'cart_items_html': cart_items_html
-        })
+            'cart_items_count': cart.item_count,
+            'cart_total': float(cart.subtotal),
+            'lines': [
+                {'id': line.id, 'quantity': line.quantity, 'total': float(line.total_price)}
+                for line in cart.lines
+            ],
+        }
+        if data.get('mode') != 'delta':
+            response['cart_items_html'] = render_to_string('cart/cart_items.html', {
+                'cart': cart,
+                'cart_items': cart.lines
+            })
+        return JsonResponse(response)
         
     except Exception as e:
         return JsonResponse({
@@ -287,18 +213,22 @@ def remove_from_cart(request):
         })
 
 def get_cart_data(request):
-    """API endpoint to get current cart data"""
+    """API endpoint to get current cart data (?html=1 adds the sidebar HTML)"""
     cart = get_cart(request)
-    cart_items_count = cart.total_items
-    cart_total = cart.total_price
     
-    return JsonResponse({
-        'cart_items_count': cart_items_count,
-        'cart_total': float(cart_total)
-    })
+    response = {
+        'cart_items_count': cart.item_count,
+        'cart_total': float(cart.subtotal)
+    }
+    if request.GET.get('html'):
+        response['cart_items_html'] = render_to_string('cart/cart_items.html', {
+            'cart': cart,
+            'cart_items': cart.lines
+        })
+    return JsonResponse(response)
 def cart_view(request):
     cart = get_cart(request)
-    cart_items = cart.items.select_related('product')
+    cart_items = cart.lines
     
     context = {
         'cart': cart,
@@ -306,11 +236,36 @@ def cart_view(request):
     }
     return render(request, 'cart/cart.html', context)
 
+# Order numbers a guest session placed; order numbers are guessable, so
+# guests may only open the confirmations listed here
+PLACED_ORDERS_SESSION_KEY = 'placed_orders'
+MAX_REMEMBERED_ORDERS = 10
+
+def _remember_order(request, order):
+    if not request.user.is_authenticated:
+        placed = request.session.get(PLACED_ORDERS_SESSION_KEY, [])
+        if order.order_number not in placed:
+            request.session[PLACED_ORDERS_SESSION_KEY] = (placed + [order.order_number])[-MAX_REMEMBERED_ORDERS:]
+
+def _order_for_token(request, token):
+    """The order already placed by this checkout form, if any"""
+    if not token:
+        return None
+    user = request.user if request.user.is_authenticated else None
+    return Order.objects.filter(checkout_token=token, user=user).first()
+
 def checkout(request):
+    # A double-clicked or retried submission gets the order the first one placed
+    checkout_token = request.POST.get('checkout_token', '')[:64] if request.method == 'POST' else ''
+    placed = _order_for_token(request, checkout_token)
+    if placed is not None:
+        _remember_order(request, placed)
+        return redirect('order_confirmation', order_number=placed.order_number)
+    
     cart = get_cart(request)
-    cart_items = cart.items.select_related('product')
+    cart_items = cart.lines
     
-    if cart_items.count() == 0:
+    if not cart_items:
         messages.warning(request, 'Your cart is empty')
         return redirect('cart')
     
@@ -319,42 +274,29 @@ def checkout(request):
         if form.is_valid():
             order = form.save(commit=False)
             order.user = request.user if request.user.is_authenticated else None
+            order.checkout_token = checkout_token or None
             
-            # Calculate total with discount
-            total_amount = cart.total_price
-            coupon_code = request.POST.get('coupon_code')
-            discount_amount = float(request.POST.get('discount_amount', 0))
-            
-            if coupon_code and discount_amount > 0:
-                try:
-                    coupon = Coupon.objects.get(code=coupon_code)
-                    if coupon.is_valid():
-                        total_amount -= discount_amount
-                        coupon.used_count += 1
-                        coupon.save()
-                except Coupon.DoesNotExist:
-                    pass
-            
-            order.total_amount = total_amount
+            # The discount is computed and the coupon redeemed in place_order
+            coupon_code = request.POST.get('coupon_code', '').strip()
             
-            # Generate order number
-            import uuid
-            order.order_number = str(uuid.uuid4())[:20]
-            
-            order.save()
-            
-            # Create order items
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.discount_price if cart_item.product.is_on_sale else cart_item.product.price
-                )
-            
-            # Clear cart
-            cart.items.all().delete()
+            try:
+                with transaction.atomic():
+                    # Guest carts live in a cookie until now; orders are built from rows
+                    db_cart = cart.to_db()
+                    place_order(order, db_cart, coupon_code=coupon_code, holder=get_holder(request))
+                    cart.clear()
+            except (CheckoutError, IntegrityError) as e:
+                # A concurrent submission of the same form may have won the race
+                placed = _order_for_token(request, checkout_token)
+                if placed is not None:
+                    _remember_order(request, placed)
+                    return redirect('order_confirmation', order_number=placed.order_number)
+                if isinstance(e, IntegrityError):
+                    raise
+                messages.error(request, str(e))
+                return redirect('cart')
             
+            _remember_order(request, order)
             messages.success(request, 'Order placed successfully!')
             return redirect('order_confirmation', order_number=order.order_number)
     else:
@@ -366,11 +308,20 @@ def checkout(request):
                 'email': request.user.email,
             }
         form = OrderForm(initial=initial_data)
+        
+        # Hold the cart's stock while the shopper fills in the form
+        quantities = {line.product.pk: line.quantity for line in cart_items}
+        short = hold_stock(get_holder(request), quantities)
+        if short:
+            names = ', '.join(product.name for product in short)
+            messages.warning(request, f'Only limited stock is left for: {names}')
     
     context = {
         'cart': cart,
         'cart_items': cart_items,
         'form': form,
+        # Kept across re-renders of an invalid form so it stays one submission
+        'checkout_token': checkout_token or secrets.token_urlsafe(32),
     }
     return render(request, 'checkout/checkout.html', context)
 
@@ -378,6 +329,8 @@ def order_confirmation(request, order_number):
     if request.user.is_authenticated:
         order = get_object_or_404(Order, order_number=order_number, user=request.user)
     else:
+        if order_number not in request.session.get(PLACED_ORDERS_SESSION_KEY, []):
+            raise Http404('Order not found')
         order = get_object_or_404(Order, order_number=order_number, user=None)
     context = {
         'order': order,
@@ -394,26 +347,8 @@ def login_view(request):
             if user is not None:
                 login(request, user)
                 
-                # Merge anonymous cart with user cart
-                session_key = request.session.session_key
-                if session_key:
-                    try:
-                        anonymous_cart = Cart.objects.get(session_key=session_key)
-                        user_cart, created = Cart.objects.get_or_create(user=user)
-                        
-                        for item in anonymous_cart.items.all():
-                            user_item, created = CartItem.objects.get_or_create(
-                                cart=user_cart,
-                                product=item.product,
-                                defaults={'quantity': item.quantity}
-                            )
-                            if not created:
-                                user_item.quantity += item.quantity
-                                user_item.save()
-                        
-                        anonymous_cart.delete()
-                    except Cart.DoesNotExist:
-                        pass
+                # Move the guest cart into the user's cart
+                merge_guest_cart(request, user)
                 
                 messages.success(request, 'Logged in successfully!')
                 return redirect('home')
@@ -480,6 +415,7 @@ def register_view(request):
         if form.is_valid():
             user = form.save()
             login(request, user)
+            merge_guest_cart(request, user)
             messages.success(request, 'Account created successfully!')
             return redirect('home')
     else:
@@ -498,49 +434,47 @@ def track_search(request):
         query = data.get('query', '').strip()
         
         if query:
-            search_obj, created = SearchQuery.objects.get_or_create(
-                query=query,
-                defaults={'count': 1}
-            )
-            if not created:
-                search_obj.count += 1
-                search_obj.save()
+            record_search(query)
         
         return JsonResponse({'success': True})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+def search_suggest(request):
+    """Autocomplete suggestions for the search box, served from memory"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = int(request.GET.get('limit', SUGGEST_LIMIT))
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    
+    response = JsonResponse({
+        'query': query,
+        'suggestions': suggest(query, limit) if query else [],
+    })
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
 @require_POST
 def apply_coupon(request):
     """Apply coupon code to cart"""
     try:
         data = json.loads(request.body)
         coupon_code = data.get('coupon_code', '').strip()
-        cart_total = float(data.get('cart_total', 0))
         
         if not coupon_code:
             return JsonResponse({'success': False, 'message': 'Coupon code is required'})
         
+        # Priced against the server-side cart, not a client-sent total
         try:
-            coupon = Coupon.objects.get(code=coupon_code)
-        except Coupon.DoesNotExist:
-            return JsonResponse({'success': False, 'message': 'Invalid coupon code'})
-        
-        if not coupon.is_valid():
-            return JsonResponse({'success': False, 'message': 'Coupon has expired or is not active'})
-        
-        if cart_total < coupon.minimum_amount:
-            return JsonResponse({
-                'success': False, 
-                'message': f'Minimum order amount is ৳{coupon.minimum_amount}'
-            })
-        
-        discount_amount = coupon.calculate_discount(cart_total)
+            coupon, discount_amount = quote_coupon(coupon_code, get_cart(request).subtotal)
+        except CouponError as e:
+            return JsonResponse({'success': False, 'message': str(e)})
         
         return JsonResponse({
             'success': True,
             'discount_amount': float(discount_amount),
-            'coupon_code': coupon_code,
+            'coupon_code': coupon.code,
             'message': f'Coupon applied successfully! You saved ৳{float(discount_amount):.2f}'
         })
         
@@ -575,20 +509,21 @@ def about_us(request):
 def contact_us(request):
     """Contact Us page"""
     if request.method == 'POST':
-        # Handle contact form submission
-        name = request.POST.get('name')
-        email = request.POST.get('email')
-        phone = request.POST.get('phone')
-        subject = request.POST.get('subject')
-        message = request.POST.get('message')
-        
-        # Here you can add logic to save the contact form or send email
-        # For now, just show a success message
-        messages.success(request, 'আপনার বার্তা সফলভাবে পাঠানো হয়েছে। আমরা শীঘ্রই আপনার সাথে যোগাযোগ করব।')
-        return redirect('contact_us')
+        form = ContactForm(request.POST)
+        if form.is_valid():
+            with transaction.atomic():
+                contact_message = form.save()
+                # The admin alert email is sent by the job worker
+                queue_contact_message(contact_message)
+            
+            messages.success(request, 'আপনার বার্তা সফলভাবে পাঠানো হয়েছে। আমরা শীঘ্রই আপনার সাথে যোগাযোগ করব।')
+            return redirect('contact_us')
+    else:
+        form = ContactForm()
     
     context = {
         'page_title': 'যোগাযোগ',
+        'form': form,
     }
     return render(request, 'pages/contact_us.html', context)
 
@@ -600,10 +535,7 @@ def offers(request):
     active_coupons = Coupon.objects.filter(is_active=True)
     
     # Get discounted products
-    discounted_products = Product.objects.filter(
-        is_active=True,
-        discount_price__isnull=False
-    ).exclude(discount_price__gte=models.F('price'))[:20]
+    discounted_products = CatalogQuery(on_sale=True).queryset()[:20]
     
     context = {
         'page_title': 'অফার',
@@ -620,97 +552,26 @@ def load_more_products(request):
         return JsonResponse({'success': False, 'message': 'Invalid request method'})
     
     try:
+        cursor = request.GET.get('cursor')
         offset = int(request.GET.get('offset', 0))
         products_per_page = int(request.GET.get('per_page', 12))
         
-        # Get all filter parameters
-        category_slug = request.GET.get('category')
-        search_query = request.GET.get('search')
-        sort_by = request.GET.get('sort')
-        min_price = request.GET.get('min_price')
-        max_price = request.GET.get('max_price')
-        price_range = request.GET.get('price_range')
-        in_stock = request.GET.get('in_stock')
-        on_sale = request.GET.get('on_sale')
-        brand = request.GET.get('brand')
+        # Same filter compiler as product_list, so pages line up
+        catalog_query = CatalogQuery.from_params(request.GET)
         
-        products = Product.objects.filter(is_active=True)
-        
-        # Apply same filters as in product_list view
-        if category_slug:
-            products = products.filter(category__slug=category_slug)
-        
-        if search_query:
-            products = products.filter(
-                models.Q(name__icontains=search_query) |
-                models.Q(description__icontains=search_query) |
-                models.Q(meta_keywords__icontains=search_query)
-            )
-        
-        # Price range filters
-        if price_range:
-            if price_range == '0-500':
-                products = products.filter(price__lte=500)
-            elif price_range == '500-1000':
-                products = products.filter(price__gte=500, price__lte=1000)
-            elif price_range == '1000-2000':
-                products = products.filter(price__gte=1000, price__lte=2000)
-            elif price_range == '2000+':
-                products = products.filter(price__gte=2000)
-        
-        # Custom price range
-        if min_price:
-            try:
-                products = products.filter(price__gte=float(min_price))
-            except ValueError:
-                pass
-        
-        if max_price:
-            try:
-                products = products.filter(price__lte=float(max_price))
-            except ValueError:
-                pass
-        
-        # Stock filter
-        if in_stock == 'true':
-            products = products.filter(stock__gt=0)
-        
-        # Sale filter
-        if on_sale == 'true':
-            products = products.filter(discount_price__isnull=False).exclude(
-                discount_price__gte=models.F('price')
-            )
-        
-        # Brand filter
-        if brand:
-            products = products.filter(brand__icontains=brand)
-        
-        # Sorting
-        if sort_by:
-            if sort_by == 'name':
-                products = products.order_by('name')
-            elif sort_by == 'price_low':
-                products = products.extra(
-                    select={'effective_price': 'COALESCE(discount_price, price)'}
-                ).order_by('effective_price')
-            elif sort_by == 'price_high':
-                products = products.extra(
-                    select={'effective_price': 'COALESCE(discount_price, price)'}
-                ).order_by('-effective_price')
-            elif sort_by == 'newest':
-                products = products.order_by('-created_at')
-            elif sort_by == 'popular':
-                products = products.order_by('-stock')
-            elif sort_by == 'discount':
-                products = products.filter(discount_price__isnull=False).extra(
-                    select={'discount_percent': '((price - discount_price) / price) * 100'}
-                ).order_by('-discount_percent')
+        # Get the next batch of products. Cursor mode seeks past the last
+        # row seen; the legacy offset mode is kept for old clients.
+        if cursor:
+            page = catalog_query.page(cursor, per_page=products_per_page)
+            next_products = page.object_list
+            has_more = page.has_more
+            next_cursor = page.next_cursor
         else:
-            products = products.order_by('-created_at')
-        
-        # Get the next batch of products
-        next_products = products[offset:offset + products_per_page]
-        has_more = products.count() > (offset + products_per_page)
+            products = catalog_query.queryset()
+            next_products = list(products[offset:offset + products_per_page + 1])
+            has_more = len(next_products) > products_per_page
+            next_products = next_products[:products_per_page]
+            next_cursor = encode_cursor(catalog_query.ordering, next_products[-1]) if has_more else None
         
         # Render the products HTML
         products_html = render_to_string('products/product_grid.html', {
@@ -721,6 +582,7 @@ def load_more_products(request):
             'success': True,
             'products_html': products_html,
             'has_more': has_more,
+            'next_cursor': next_cursor,
             'loaded_count': len(next_products)
         })
         
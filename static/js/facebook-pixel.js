@@ -99,7 +99,8 @@ function trackPurchase(orderData) {
     };
 
     debugLog('Tracking Purchase', eventData);
-    fbq('track', 'Purchase', eventData);
+    // Same id as the server-side event, so Facebook counts the purchase once
+    fbq('track', 'Purchase', eventData, { eventID: orderData.order_id });
 }
 
 // Track Search event
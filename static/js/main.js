@@ -275,7 +275,7 @@ function setupCartFunctionality() {
                     const currentQuantity = parseInt(quantityInput.value);
                     const newQuantity = currentQuantity + 1;
                     quantityInput.value = newQuantity;
-                    updateCartItem(itemId, newQuantity);
+                    queueCartOperation({op: 'set', item_id: itemId, quantity: newQuantity});
                 }
             }
         }
@@ -291,9 +291,9 @@ function setupCartFunctionality() {
                     if (currentQuantity > 1) {
                         const newQuantity = currentQuantity - 1;
                         quantityInput.value = newQuantity;
-                        updateCartItem(itemId, newQuantity);
+                        queueCartOperation({op: 'set', item_id: itemId, quantity: newQuantity});
                     } else {
-                        removeFromCart(itemId);
+                        queueCartOperation({op: 'remove', item_id: itemId});
                     }
                 }
             }
@@ -317,9 +317,9 @@ function setupCartFunctionality() {
             const quantity = parseInt(input.value);
             
             if (itemId && quantity > 0) {
-                updateCartItem(itemId, quantity);
+                queueCartOperation({op: 'set', item_id: itemId, quantity: quantity});
             } else if (itemId) {
-                removeFromCart(itemId);
+                queueCartOperation({op: 'remove', item_id: itemId});
             }
         }
     });
@@ -378,6 +378,14 @@ function setupSearchFunctionality() {
                 performSearch(this.value);
             }
         });
+        
+        // Instant suggestions while typing
+        let suggestTimer = null;
+        searchInput.addEventListener('input', function() {
+            clearTimeout(suggestTimer);
+            const query = this.value.trim();
+            suggestTimer = setTimeout(() => fetchSearchSuggestions(query), 120);
+        });
     }
     
     if (mainSearchInput) {
@@ -413,7 +421,8 @@ function addToCart(productId, quantity = 1) {
         },
         body: JSON.stringify({
             product_id: productId,
-            quantity: parseInt(quantity)
+            quantity: parseInt(quantity),
+            mode: 'delta'
         })
     })
     .then(response => {
@@ -455,7 +464,8 @@ function updateCartItem(itemId, quantity) {
         },
         body: JSON.stringify({
             item_id: itemId,
-            quantity: parseInt(quantity)
+            quantity: parseInt(quantity),
+            mode: 'delta'
         })
     })
     .then(response => {
@@ -494,7 +504,8 @@ function removeFromCart(itemId) {
             'X-CSRFToken': getCSRFToken()
         },
         body: JSON.stringify({
-            item_id: itemId
+            item_id: itemId,
+            mode: 'delta'
         })
     })
     .then(response => {
@@ -521,6 +532,61 @@ function removeFromCart(itemId) {
     });
 }
 
+// Quantity changes are collected for a moment and sent as one batch
+let pendingCartOperations = {};
+let cartBatchTimer = null;
+
+function queueCartOperation(operation) {
+    // Only the last change to each line matters
+    pendingCartOperations[operation.item_id] = operation;
+    clearTimeout(cartBatchTimer);
+    cartBatchTimer = setTimeout(flushCartOperations, 300);
+}
+
+function flushCartOperations() {
+    const operations = Object.values(pendingCartOperations);
+    pendingCartOperations = {};
+    if (!operations.length) return;
+    
+    console.log('API: কার্ট ব্যাচ আপডেট করা হচ্ছে:', operations);
+    showLoadingState(true);
+    
+    fetch('/cart/batch/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCSRFToken()
+        },
+        body: JSON.stringify({
+            operations: operations,
+            mode: 'delta'
+        })
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (data.success) {
+            updateCartUI(data);
+            showToast('কার্ট সফলভাবে আপডেট করা হয়েছে!', 'success');
+        } else {
+            showToast(data.message || 'কার্ট আপডেট করতে ব্যর্থ হয়েছে', 'error');
+            // Nothing was applied; show the cart as the server has it
+            refreshCartItemsHtml();
+        }
+    })
+    .catch(error => {
+        console.error('কার্ট আপডেট করার সময় ত্রুটি:', error);
+        showToast('কার্ট আপডেট করতে সমস্যা হয়েছে। আবার চেষ্টা করুন।', 'error');
+    })
+    .finally(() => {
+        showLoadingState(false);
+    });
+}
+
 function buyNow(productId, quantity = 1) {
     console.log(`এখনই কিনুন - পণ্য: ${productId}, পরিমাণ: ${quantity}`);
     
@@ -622,9 +688,72 @@ function updateCartUI(data) {
         document.getElementById('cartItems').innerHTML = data.cart_items_html;
     }
     
+    // Or patch just the line that changed
+    if (data.line) {
+        applyCartLineDelta(data.line);
+    }
+    
+    // Or sync every line (batch responses)
+    if (data.lines && !data.cart_items_html) {
+        applyCartLines(data.lines);
+    }
+    
     console.log('কার্ট UI সফলভাবে আপডেট হয়েছে');
 }
 
+function applyCartLineDelta(line) {
+    const rows = document.querySelectorAll(`.cart-item[data-item-id="${line.id}"]`);
+    
+    if (line.removed) {
+        rows.forEach(row => row.remove());
+        // Show the empty-cart message from the server when nothing is left
+        if (!document.querySelector('#cartItems .cart-item')) {
+            refreshCartItemsHtml();
+        }
+        return;
+    }
+    
+    if (!rows.length) {
+        // A product that isn't in the sidebar yet: fetch the full list once
+        refreshCartItemsHtml();
+        return;
+    }
+    
+    document.querySelectorAll(`.quantity-input[data-item-id="${line.id}"]`).forEach(input => {
+        input.value = line.quantity;
+    });
+}
+
+function applyCartLines(lines) {
+    const ids = new Set(lines.map(line => String(line.id)));
+    document.querySelectorAll('.cart-item').forEach(row => {
+        if (!ids.has(row.getAttribute('data-item-id'))) {
+            row.remove();
+        }
+    });
+    
+    const missing = lines.some(line => !document.querySelector(`.cart-item[data-item-id="${line.id}"]`));
+    if (missing || !lines.length) {
+        refreshCartItemsHtml();
+        return;
+    }
+    
+    lines.forEach(line => {
+        document.querySelectorAll(`.quantity-input[data-item-id="${line.id}"]`).forEach(input => {
+            input.value = line.quantity;
+        });
+    });
+}
+
+function refreshCartItemsHtml() {
+    fetch('/cart/data/?html=1')
+        .then(response => response.json())
+        .then(data => updateCartUI(data))
+        .catch(error => {
+            console.error('কার্ট লোড করতে ত্রুটি:', error);
+        });
+}
+
 function openCartSidebar() {
     console.log('প্রোগ্রাম্যাটিকভাবে কার্ট সাইডবার খোলা হচ্ছে...');
     const cartSidebar = document.getElementById('cartSidebar');
@@ -744,6 +873,68 @@ function performSearch(query) {
     }
 }
 
+// Search suggestions
+const SUGGESTION_LABELS = {
+    category: 'ক্যাটেগরি',
+    brand: 'ব্র্যান্ড',
+    query: 'জনপ্রিয় সার্চ',
+    product: 'পণ্য'
+};
+let latestSuggestQuery = '';
+
+function fetchSearchSuggestions(query) {
+    latestSuggestQuery = query;
+    if (!query) {
+        renderSearchSuggestions([]);
+        return;
+    }
+    
+    fetch(`/search/suggest/?q=${encodeURIComponent(query)}`)
+        .then(response => response.json())
+        .then(data => {
+            // Ignore answers to keystrokes that have been typed over
+            if (data.query === latestSuggestQuery) {
+                renderSearchSuggestions(data.suggestions || []);
+            }
+        })
+        .catch(error => {
+            console.log('Search suggestions failed:', error);
+        });
+}
+
+function renderSearchSuggestions(suggestions) {
+    const container = document.getElementById('searchSuggestions');
+    if (!container) return;
+    
+    container.innerHTML = '';
+    if (!suggestions.length) {
+        container.classList.add('hidden');
+        return;
+    }
+    
+    suggestions.forEach(suggestion => {
+        const item = document.createElement('a');
+        item.href = suggestion.url;
+        item.className = 'flex items-center justify-between px-4 py-2 text-sm hover:bg-gray-100';
+        
+        const text = document.createElement('span');
+        text.textContent = suggestion.text;
+        const label = document.createElement('span');
+        label.className = 'text-xs text-gray-400 ml-2';
+        label.textContent = SUGGESTION_LABELS[suggestion.type] || '';
+        item.append(text, label);
+        
+        if (suggestion.type === 'query') {
+            item.addEventListener('click', function(e) {
+                e.preventDefault();
+                performSearch(suggestion.text);
+            });
+        }
+        container.appendChild(item);
+    });
+    container.classList.remove('hidden');
+}
+
 // Initialize cart data on page load
 function initializeCartData() {
     console.log('কার্ট ডেটা ইনিশিয়ালাইজ করা হচ্ছে...');